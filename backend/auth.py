@@ -8,7 +8,7 @@ from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import os
 
-from . import crud, database, schemas
+from . import crud, database, models, schemas
 
 load_dotenv()
 
@@ -50,6 +50,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     user = crud.get_user_by_email(db, email=token_data.email)
-    if user is None:
+    if user is None or not user.is_active:
         raise credentials_exception
     return user
+
+def get_current_admin(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -1,9 +1,11 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import or_, and_, func, case
 from typing import List, Optional
 from datetime import datetime
 
-from . import models, schemas
+from . import models, schemas, message_buffer, jobs, safety_stats, swipe_archive, database
+from .safety_cache import block_cache
+from .profile_cache import profile_cache
 # auth imported below to avoid circular
 
 # User CRUD
@@ -26,6 +28,9 @@ def create_user(db: Session, user: schemas.UserCreate):
 def get_user_profile(db: Session, user_id: int):
     return db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
 
+def get_profile_version(db: Session, user_id: int):
+    return db.query(models.Profile.id, models.Profile.version).filter(models.Profile.user_id == user_id).first()
+
 def create_user_profile(db: Session, profile: schemas.ProfileCreate, user_id: int):
     db_profile = models.Profile(**profile.dict(), user_id=user_id)
     db.add(db_profile)
@@ -41,9 +46,11 @@ def update_user_profile(db: Session, profile: schemas.ProfileUpdate, user_id: in
     profile_data = profile.dict(exclude_unset=True)
     for key, value in profile_data.items():
         setattr(db_profile, key, value)
+    db_profile.version = (db_profile.version or 0) + 1
 
     db.add(db_profile)
     db.commit()
+    profile_cache.invalidate(user_id)
     db.refresh(db_profile)
     return db_profile
 
@@ -56,35 +63,53 @@ def set_user_onboarded(db: Session, user_id: int):
         db.refresh(db_user)
     return db_user
 
+def record_upload(db: Session, filename: str, user_id: int):
+    db.add(models.Upload(filename=filename, user_id=user_id))
+    db.commit()
+
 # Discovery CRUD
 def get_potential_matches(db: Session, user_id: int, limit: int = 10, gender_filter: Optional[str] = None):
-    # 1. Users already swiped
-    swiped_rows = db.query(models.Swipe.target_id).filter(models.Swipe.user_id == user_id).all()
-    swiped_ids = [row[0] for row in swiped_rows]
-
-    # 2. Users blocked by current user
-    blocked_rows = db.query(models.Block.blocked_id).filter(models.Block.blocker_id == user_id).all()
-    blocked_ids = [row[0] for row in blocked_rows]
+    # 1. Users already swiped: recent swipes are excluded in SQL, archived passes in memory
+    recent_swipes = db.query(models.Swipe.target_id).filter(models.Swipe.user_id == user_id)
+    archived_ids = swipe_archive.archived_passes(db, user_id)
 
-    # 3. Users who blocked current user (reciprocal safety)
-    blocked_by_rows = db.query(models.Block.blocker_id).filter(models.Block.blocked_id == user_id).all()
-    blocker_ids = [row[0] for row in blocked_by_rows]
+    # 2. Users blocked by or blocking the current user (reciprocal safety)
+    blocked_ids = block_cache.get(db, user_id)
 
-    exclude_ids = list(set(swiped_ids + blocked_ids + blocker_ids + [user_id]))
-
-    query = db.query(models.User).join(models.Profile).filter(models.User.id.notin_(exclude_ids))
+    query = db.query(models.User.id, models.Profile.version).join(models.Profile).filter(
+        models.User.id != user_id,
+        models.User.id.notin_(recent_swipes),
+        models.User.is_active == True
+    )
 
     # Apply filters
     if gender_filter:
         query = query.filter(models.Profile.gender == gender_filter)
 
-    potential_users = query.limit(limit).all()
-
-    profiles = []
-    for user in potential_users:
-        if user.profile:
-            profiles.append(user.profile)
-    return profiles
+    versions = {}
+    last_id = 0
+    page_size = limit * 2
+    while len(versions) < limit:
+        # Jump over a run of consecutive archived ids without reading it
+        last_id = swipe_archive.run_end(archived_ids, last_id + 1)
+        batch = query.filter(models.User.id > last_id).order_by(models.User.id).limit(page_size).all()
+        skipped = swipe_archive.between(archived_ids, batch[0][0], batch[-1][0]) if batch else set()
+        for candidate_id, version in batch:
+            if candidate_id in skipped or candidate_id in blocked_ids:
+                continue
+            versions[candidate_id] = version
+            if len(versions) == limit:
+                break
+        if len(batch) < page_size:
+            break
+        last_id = batch[-1][0]
+        # Grow the page while it's mostly archived passes, so heavy swipers take
+        # O(log n) queries rather than one per page of skipped ids.
+        page_size *= 2
+
+    # Serialized ProfileResponse payloads, from the cache where the version still matches
+    profiles = profile_cache.get_many(db, versions)
+    return [profiles[candidate_id] for candidate_id in versions if candidate_id in profiles]
 
 # Swipe CRUD
 def create_swipe(db: Session, swipe: schemas.SwipeCreate, user_id: int):
@@ -94,7 +119,7 @@ def create_swipe(db: Session, swipe: schemas.SwipeCreate, user_id: int):
         models.Swipe.target_id == swipe.target_id
     ).first()
 
-    if existing:
+    if existing or swipe_archive.is_archived_pass(db, user_id, swipe.target_id):
         return {"is_match": False} # Already swiped, ignore
 
     db_swipe = models.Swipe(user_id=user_id, target_id=swipe.target_id, is_like=swipe.is_like)
@@ -121,6 +146,7 @@ def create_swipe(db: Session, swipe: schemas.SwipeCreate, user_id: int):
 
             if not match_exists:
                 is_match = True
+                database.lock_id_order(db, models.Match.__tablename__)
                 match = models.Match(user1_id=min(user_id, swipe.target_id), user2_id=max(user_id, swipe.target_id), timestamp=datetime.utcnow())
                 db.add(match)
                 db.commit()
@@ -128,38 +154,85 @@ def create_swipe(db: Session, swipe: schemas.SwipeCreate, user_id: int):
     return {"is_match": is_match}
 
 # Match CRUD
-def get_matches_for_user(db: Session, user_id: int):
-    # Eager load users to avoid N+1 queries later if possible, though we need logic to pick the "other" one.
-    matches = db.query(models.Match).options(
-        joinedload(models.Match.user1).joinedload(models.User.profile),
-        joinedload(models.Match.user2).joinedload(models.User.profile)
+def _partner_id(user_id: int):
+    return case((models.Match.user1_id == user_id, models.Match.user2_id), else_=models.Match.user1_id)
+
+def get_inbox_state(db: Session, user_id: int):
+    """Cheap aggregate that changes whenever the user's match list would.
+
+    `matches` lists (match_id, partner profile version) for every visible match in
+    id order, so a sync token can tell whether rows it has seen were removed,
+    reused or had their partner edit a profile.
+    """
+    partner_profile = aliased(models.Profile)
+    rows = db.query(
+        models.Match.id,
+        _partner_id(user_id),
+        partner_profile.version,
+        models.Match.timestamp
+    ).outerjoin(
+        partner_profile, partner_profile.user_id == _partner_id(user_id)
+    ).filter(
+        or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id),
+        models.Match.deleted_at.is_(None)
+    ).order_by(models.Match.id).all()
+
+    blocked_ids = block_cache.get(db, user_id)
+    visible = [row for row in rows if row[1] not in blocked_ids]
+
+    max_message_id = db.query(func.max(models.Message.id)).join(models.Match).filter(
+        or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id),
+        models.Match.deleted_at.is_(None)
+    ).scalar()
+
+    max_message_id = max_message_id or 0
+    buffer = message_buffer.buffer
+    first_pending_id = buffer.first_pending_id() if buffer else None
+    if first_pending_id is not None:
+        # Buffered messages can commit after higher ids do; keep the cursor below them.
+        max_message_id = min(max_message_id, first_pending_id - 1)
+
+    return {
+        "matches": [(match_id, version or 0) for match_id, _, version, _ in visible],
+        "max_match_id": rows[-1][0] if rows else 0,
+        "max_message_id": max_message_id,
+        "last_activity": max((row[3] for row in visible if row[3]), default=None),
+    }
+
+def get_matches_for_user(db: Session, user_id: int, after_match_id: Optional[int] = None,
+                         after_message_id: int = 0):
+    """Inbox rows as JSON-ready dicts, with partner profiles served from the profile cache."""
+    partner = aliased(models.User)
+    partner_profile = aliased(models.Profile)
+    query = db.query(models.Match, partner, partner_profile.id, partner_profile.version).join(
+        partner, partner.id == _partner_id(user_id)
+    ).outerjoin(
+        partner_profile, partner_profile.user_id == partner.id
     ).filter(
-        or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id)
-    ).order_by(models.Match.timestamp.desc()).all()
+        or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id),
+        models.Match.deleted_at.is_(None)
+    )
 
-    result = []
-    for match in matches:
-        other_user_id = match.user2_id if match.user1_id == user_id else match.user1_id
-
-        # Determine the other user object
-        if match.user1_id == other_user_id:
-            other_user = match.user1
-        else:
-            other_user = match.user2
-
-        if not other_user:
-            continue
-
-        # Check block (can optimize by filtering in main query but complex with OR)
-        block_exists = db.query(models.Block).filter(
-            or_(
-                and_(models.Block.blocker_id == user_id, models.Block.blocked_id == other_user_id),
-                and_(models.Block.blocker_id == other_user_id, models.Block.blocked_id == user_id)
+    if after_match_id is not None:
+        # Delta sync: new matches and matches with new messages. Found by id rather than
+        # timestamp, because a timestamp is taken before its commit and can land behind a
+        # cursor the client already holds. Partner edits reset the sync instead.
+        query = query.filter(or_(
+            models.Match.id > after_match_id,
+            models.Match.id.in_(
+                db.query(models.Message.match_id).filter(models.Message.id > after_message_id)
             )
-        ).first()
-        if block_exists:
-            continue
+        ))
+
+    blocked_ids = block_cache.get(db, user_id)
+    rows = [row for row in query.order_by(models.Match.timestamp.desc()).all() if row[1].id not in blocked_ids]
 
+    profiles = profile_cache.get_many(db, {
+        other_user.id: version for _, other_user, profile_id, version in rows if profile_id is not None
+    })
+
+    result = []
+    for match, other_user, _, _ in rows:
         last_message = db.query(models.Message).filter(models.Message.match_id == match.id).order_by(models.Message.timestamp.desc()).first()
         unread_count = db.query(models.Message).filter(
             models.Message.match_id == match.id,
@@ -169,28 +242,64 @@ def get_matches_for_user(db: Session, user_id: int):
 
         result.append({
             "id": match.id,
-            "user": other_user,
-            "last_message": last_message,
+            "user": {
+                "id": other_user.id,
+                "email": other_user.email,
+                "is_active": other_user.is_active,
+                "is_onboarded": other_user.is_onboarded,
+                "is_verified": other_user.is_verified,
+                "is_admin": other_user.is_admin,
+                "profile": profiles.get(other_user.id),
+            },
+            "last_message": schemas.MessageResponse.model_validate(last_message).model_dump(mode="json") if last_message else None,
             "unread_count": unread_count,
-            "timestamp": match.timestamp or datetime.utcnow()
+            "timestamp": (match.timestamp or datetime.utcnow()).isoformat()
         })
 
     return result
 
+def get_messages_state(db: Session, match_id: int):
+    count, max_id = db.query(func.count(models.Message.id), func.max(models.Message.id)).filter(
+        models.Message.match_id == match_id
+    ).one()
+    buffer = message_buffer.buffer
+    pending = buffer.pending_for_match(match_id) if buffer else []
+    return count, max([max_id or 0] + [m.id for m in pending]), len(pending)
+
 def get_messages(db: Session, match_id: int, limit: int = 50):
-    return db.query(models.Message).filter(models.Message.match_id == match_id).order_by(models.Message.timestamp.asc()).limit(limit).all()
+    buffer = message_buffer.buffer
+    # Snapshot pending writes before reading, so a flush in between can't hide a message.
+    pending = buffer.pending_for_match(match_id) if buffer else []
+
+    messages = db.query(models.Message).filter(models.Message.match_id == match_id).order_by(models.Message.timestamp.asc()).limit(limit).all()
+    if pending:
+        seen = {m.id for m in messages}
+        messages.extend(m for m in pending if m.id not in seen)
+        messages = messages[:limit]
+    return messages
 
 def create_message(db: Session, message: schemas.MessageCreate, user_id: int, match_id: int):
-    match = db.query(models.Match).filter(models.Match.id == match_id).first()
+    match = db.query(models.Match).filter(models.Match.id == match_id, models.Match.deleted_at.is_(None)).first()
     if not match:
         return None
     if match.user1_id != user_id and match.user2_id != user_id:
         return None
 
+    if message_buffer.buffer:
+        # Hand the pooled connection back while we wait on the group commit.
+        db.rollback()
+        try:
+            return message_buffer.buffer.submit(match_id, user_id, message.text)
+        except message_buffer.MessageFlushError:
+            return None
+
+    database.lock_id_order(db, models.Message.__tablename__)
     db_message = models.Message(
         match_id=match_id,
         sender_id=user_id,
-        text=message.text
+        text=message.text,
+        # Set here rather than by the column default so the match timestamp below isn't None
+        timestamp=datetime.utcnow()
     )
     db.add(db_message)
 
@@ -204,32 +313,121 @@ def create_message(db: Session, message: schemas.MessageCreate, user_id: int, ma
 
 # Safety CRUD
 def create_report(db: Session, report: schemas.ReportCreate, reporter_id: int):
-    db_report = models.Report(reporter_id=reporter_id, reported_id=report.reported_id, reason=report.reason)
+    db_report = models.Report(reporter_id=reporter_id, reported_id=report.reported_id, reason=report.reason, timestamp=datetime.utcnow())
     db.add(db_report)
+    safety_stats.bump(db, report.reported_id, reports=1, reported_at=db_report.timestamp)
     db.commit()
     return db_report
 
 def create_block(db: Session, block: schemas.BlockCreate, blocker_id: int):
     db_block = models.Block(blocker_id=blocker_id, blocked_id=block.blocked_id)
     db.add(db_block)
+    safety_stats.bump(db, block.blocked_id, blocks=1)
 
+    # Matches are always stored with user1_id < user2_id (see create_swipe)
     match = db.query(models.Match).filter(
-        or_(
-            and_(models.Match.user1_id == blocker_id, models.Match.user2_id == block.blocked_id),
-            and_(models.Match.user1_id == block.blocked_id, models.Match.user2_id == blocker_id)
-        )
+        models.Match.user1_id == min(blocker_id, block.blocked_id),
+        models.Match.user2_id == max(blocker_id, block.blocked_id),
+        models.Match.deleted_at.is_(None)
     ).first()
 
     if match:
-        db.delete(match)
+        _remove_match(db, match)
 
     db.commit()
+    block_cache.add(blocker_id, block.blocked_id)
     return db_block
 
+def _remove_match(db: Session, match: models.Match):
+    # Hide the match now; its messages are deleted in batches by the job worker.
+    match.deleted_at = datetime.utcnow()
+    db.add(match)
+    jobs.enqueue(db, "delete_match", {"match_id": match.id})
+
 def unmatch_user(db: Session, match_id: int, user_id: int):
-    match = db.query(models.Match).filter(models.Match.id == match_id).first()
+    match = db.query(models.Match).filter(models.Match.id == match_id, models.Match.deleted_at.is_(None)).first()
     if match and (match.user1_id == user_id or match.user2_id == user_id):
-        db.delete(match)
+        _remove_match(db, match)
         db.commit()
         return True
     return False
+
+# Account CRUD
+def delete_account(db: Session, user_id: int):
+    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not db_user:
+        return False
+
+    # Deactivate and hide everything user-visible now; the job worker removes the data.
+    db_user.is_active = False
+    db.add(db_user)
+    db.query(models.Match).filter(
+        or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id),
+        models.Match.deleted_at.is_(None)
+    ).update({models.Match.deleted_at: datetime.utcnow()}, synchronize_session=False)
+    jobs.enqueue(db, "delete_account", {"user_id": user_id})
+    db.commit()
+
+    block_cache.invalidate(user_id)
+    return True
+
+# Admin CRUD
+def _page(items, limit, cursor_of):
+    next_cursor = cursor_of(items[limit - 1]) if len(items) > limit else None
+    return {"items": items[:limit], "next_cursor": next_cursor}
+
+def _parse_cursor(cursor: Optional[str], parts: int):
+    try:
+        values = [int(v) for v in cursor.split(":")]
+    except (AttributeError, ValueError):
+        return None
+    return values if len(values) == parts else None
+
+def get_most_reported_users(db: Session, limit: int = 20, cursor: Optional[str] = None, by: str = "reports"):
+    """Users ordered by reports (or blocks) received, keyset-paginated on (count, user_id)."""
+    Stats = models.UserSafetyStats
+    count_column = Stats.reports_received if by == "reports" else Stats.blocks_received
+
+    query = db.query(Stats, models.User.email, models.Profile.name).join(
+        models.User, models.User.id == Stats.user_id
+    ).outerjoin(models.Profile, models.Profile.user_id == Stats.user_id).filter(count_column > 0)
+
+    after = _parse_cursor(cursor, 2)
+    if after:
+        count, user_id = after
+        query = query.filter(or_(count_column < count, and_(count_column == count, Stats.user_id < user_id)))
+
+    rows = query.order_by(count_column.desc(), Stats.user_id.desc()).limit(limit + 1).all()
+    items = [{
+        "user_id": stats.user_id,
+        "email": email,
+        "name": name,
+        "reports_received": stats.reports_received,
+        "blocks_received": stats.blocks_received,
+        "last_reported_at": stats.last_reported_at,
+    } for stats, email, name in rows]
+    counter = "reports_received" if by == "reports" else "blocks_received"
+    return _page(items, limit, lambda item: f"{item[counter]}:{item['user_id']}")
+
+def get_recent_reports(db: Session, limit: int = 20, cursor: Optional[str] = None, reported_id: Optional[int] = None):
+    query = db.query(models.Report)
+    if reported_id is not None:
+        query = query.filter(models.Report.reported_id == reported_id)
+    before = _parse_cursor(cursor, 1)
+    if before:
+        query = query.filter(models.Report.id < before[0])
+    reports = query.order_by(models.Report.id.desc()).limit(limit + 1).all()
+    return _page(reports, limit, lambda report: str(report.id))
+
+def schedule_safety_stats_backfill(db: Session):
+    """Queue a full counter rebuild if reports/blocks predate the counters table."""
+    if db.query(models.UserSafetyStats.user_id).first():
+        return
+    if not (db.query(models.Report.id).first() or db.query(models.Block.id).first()):
+        return
+    pending = db.query(models.Job.id).filter(
+        models.Job.kind == "refresh_safety_stats", models.Job.status.in_(["pending", "running"])
+    ).first()
+    if not pending:
+        jobs.enqueue(db, "refresh_safety_stats", {})
+        db.commit()
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -35,3 +35,76 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def add_missing_columns_and_indexes(engine, metadata):
+    """create_all() only creates missing tables; bring existing ones up to date."""
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+
+def add_sqlite_autoincrement(engine, metadata):
+    """SQLite can't ALTER a table into AUTOINCREMENT, so copy existing rows into a rebuilt table."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not table.dialect_options["sqlite"]["autoincrement"]:
+                continue
+            sql = conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+            ), {"name": table.name}).scalar()
+            if sql is None or "AUTOINCREMENT" in sql.upper():
+                continue
+            columns = ", ".join(
+                row[1] for row in conn.execute(text(f"PRAGMA table_info({table.name})")) if row[1] in table.c
+            )
+            # Index names are global in SQLite, so they have to go before the new table is created.
+            indexes = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"
+            ), {"name": table.name}).scalars().all()
+            for index in indexes:
+                conn.execute(text(f"DROP INDEX {index}"))
+            # Legacy rename leaves views and other tables' foreign keys pointing at the
+            # original name; triggers move to the old table and are dropped with it.
+            conn.execute(text("PRAGMA legacy_alter_table = ON"))
+            conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+            table.create(bind=conn)
+            conn.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old"))
+            conn.execute(text(f"DROP TABLE {table.name}_old"))
+            conn.execute(text("PRAGMA legacy_alter_table = OFF"))
+
+def last_issued_id(conn, table_name: str) -> int:
+    """Highest id the database has handed out for `table_name`, including deleted rows."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        value = conn.execute(text(
+            "SELECT seq FROM sqlite_sequence WHERE name = :name"
+        ), {"name": table_name}).scalar()
+    elif dialect == "postgresql":
+        value = conn.execute(text(
+            "SELECT pg_sequence_last_value(pg_get_serial_sequence(:name, 'id')::regclass)"
+        ), {"name": table_name}).scalar()
+    else:
+        value = None
+    return value or 0
+
+def lock_id_order(db, table_name: str):
+    """Keep rows of `table_name` committing in id order until this transaction ends.
+
+    Postgres takes serial ids before commit, so two concurrent inserts can become
+    visible out of id order and slip behind a sync cursor. SQLite already has a
+    single writer.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": table_name})
@@ -0,0 +1,57 @@
+import base64
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    # Weak: the tag is derived from version stamps, not from the serialized bytes.
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 if the client already has this version, before anything is serialized."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {_opaque(tag) for tag in header.split(",")}
+    if "*" in tags or _opaque(etag) in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def inbox_digest(matches) -> str:
+    """Digest of (match_id, partner profile version) pairs, as listed by crud.get_inbox_state."""
+    return hashlib.sha1(repr(list(matches)).encode()).hexdigest()[:20]
+
+
+def encode_sync_token(inbox_state: dict) -> str:
+    raw = "|".join([
+        str(inbox_state["max_match_id"]),
+        str(inbox_state["max_message_id"]),
+        inbox_digest(inbox_state["matches"]),
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_sync_token(token: str):
+    """Return (max_match_id, max_message_id, digest), or None if the token is unusable."""
+    try:
+        max_match_id, max_message_id, digest = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+        return int(max_match_id), int(max_message_id), digest
+    except ValueError:
+        return None
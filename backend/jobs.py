@@ -0,0 +1,333 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from . import models, database, safety_stats, swipe_archive
+
+logger = logging.getLogger(__name__)
+
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "500"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# A running job whose worker hasn't finished within the lease is handed to another worker.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "24"))
+SWIPE_ARCHIVE_USERS_PER_BATCH = int(os.getenv("SWIPE_ARCHIVE_USERS_PER_BATCH", "100"))
+# Also bounds a batch by swipes moved, since a single heavy swiper can have millions.
+SWIPE_ARCHIVE_ROWS_PER_BATCH = int(os.getenv("SWIPE_ARCHIVE_ROWS_PER_BATCH", "5000"))
+# Run a worker thread inside the API process. Set to "false" when running
+# `python -m backend.jobs` as a separate worker process.
+JOB_WORKER_INLINE = os.getenv("JOB_WORKER_INLINE", "true").lower() == "true"
+
+UPLOAD_DIR = "uploads"
+
+# kind -> handler(db, payload). A handler does one bounded batch of work inside
+# the caller's transaction and returns True if it has more to do; changes it makes
+# to `payload` are saved for the next batch.
+HANDLERS: Dict[str, Callable[[Session, dict], bool]] = {}
+
+
+def handler(kind: str):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(db: Session, kind: str, payload: dict) -> models.Job:
+    """Add a job to the caller's transaction; it becomes visible when the caller commits."""
+    job = models.Job(kind=kind, payload=payload, status="pending", run_after=datetime.utcnow())
+    db.add(job)
+    return job
+
+
+# --- Handlers ---
+
+def _delete_in_batches(db: Session, model, *criteria, before_delete=None) -> bool:
+    ids = [row[0] for row in db.query(model.id).filter(*criteria).limit(JOB_BATCH_SIZE).all()]
+    if ids:
+        if before_delete:
+            before_delete(ids)
+        db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids) == JOB_BATCH_SIZE
+
+
+@handler("delete_match")
+def delete_match(db: Session, payload: dict) -> bool:
+    match_id = payload["match_id"]
+    if _delete_in_batches(db, models.Message, models.Message.match_id == match_id):
+        return True
+    db.query(models.Match).filter(models.Match.id == match_id).delete(synchronize_session=False)
+    return False
+
+
+@handler("delete_account")
+def delete_account(db: Session, payload: dict) -> bool:
+    user_id = payload["user_id"]
+    if "files" in payload:
+        # The rows are gone and that is committed, so the uploads can go too.
+        for path in payload["files"]:
+            if os.path.isfile(path):
+                os.remove(path)
+        return False
+
+    match_ids = db.query(models.Match.id).filter(
+        or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id)
+    ).scalar_subquery()
+
+    def uncount_blocks(ids):
+        # Take this user's blocks of others out of those users' counters.
+        rows = db.query(models.Block.blocked_id, func.count()).filter(
+            models.Block.id.in_(ids), models.Block.blocker_id == user_id
+        ).group_by(models.Block.blocked_id).all()
+        for blocked_id, count in rows:
+            safety_stats.bump(db, blocked_id, blocks=-count)
+
+    steps = [
+        (models.Message, [models.Message.match_id.in_(match_ids)], None),
+        (models.Match, [or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id)], None),
+        # Separate steps rather than an OR, so each one stays on its own index.
+        (models.Swipe, [models.Swipe.user_id == user_id], None),
+        (models.Swipe, [models.Swipe.target_id == user_id], None),
+        (models.Block, [or_(models.Block.blocker_id == user_id, models.Block.blocked_id == user_id)], uncount_blocks),
+    ]
+    for model, criteria, before_delete in steps:
+        if db.query(model.id).filter(*criteria).first():
+            _delete_in_batches(db, model, *criteria, before_delete=before_delete)
+            return True
+
+    # Reports are moderation history and are kept: the ones this user filed lose
+    # their reporter, and the ones about this user stay as they are.
+    report_ids = [row[0] for row in db.query(models.Report.id).filter(
+        models.Report.reporter_id == user_id
+    ).limit(JOB_BATCH_SIZE).all()]
+    if report_ids:
+        db.query(models.Report).filter(models.Report.id.in_(report_ids)).update(
+            {models.Report.reporter_id: None}, synchronize_session=False
+        )
+        return True
+
+    # Only files this user uploaded: profile.images is user-supplied and may
+    # point at anyone's upload.
+    uploads = db.query(models.Upload).filter(models.Upload.user_id == user_id)
+    files = [os.path.join(UPLOAD_DIR, os.path.basename(u.filename)) for u in uploads]
+    uploads.delete(synchronize_session=False)
+    profile = db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
+    if profile:
+        db.delete(profile)
+    db.query(models.SwipeArchive).filter(models.SwipeArchive.user_id == user_id).delete(synchronize_session=False)
+
+    if db.query(models.Report.id).filter(models.Report.reported_id == user_id).first():
+        # Reports still point at this user: keep a scrubbed row so they (and the
+        # report counters) stay resolvable in the admin dashboard.
+        db.query(models.User).filter(models.User.id == user_id).update({
+            models.User.email: f"deleted-{user_id}@deleted.invalid",
+            models.User.hashed_password: None,
+            models.User.is_active: False,
+        }, synchronize_session=False)
+        db.query(models.UserSafetyStats).filter(models.UserSafetyStats.user_id == user_id).update(
+            {models.UserSafetyStats.blocks_received: 0}, synchronize_session=False
+        )
+    else:
+        db.query(models.UserSafetyStats).filter(models.UserSafetyStats.user_id == user_id).delete(synchronize_session=False)
+        db.query(models.User).filter(models.User.id == user_id).delete(synchronize_session=False)
+
+    # Remove the uploads in a final batch, once this one has committed.
+    payload["files"] = files
+    return True
+
+
+@handler("refresh_safety_stats")
+def refresh_safety_stats(db: Session, payload: dict) -> bool:
+    """Rebuild moderation counters from scratch, JOB_BATCH_SIZE user ids at a time."""
+    first_user_id = payload.get("next_user_id", 0)
+    max_user_id = db.query(func.max(models.User.id)).scalar() or 0
+    last_user_id = first_user_id + JOB_BATCH_SIZE - 1
+    safety_stats.recompute(db, first_user_id, last_user_id)
+    payload["next_user_id"] = last_user_id + 1
+    return last_user_id < max_user_id
+
+
+@handler("archive_swipes")
+def archive_swipes(db: Session, payload: dict) -> bool:
+    """Move old passes out of `swipes` into per-user archives, a range of users at a time."""
+    if "cutoff" not in payload:
+        payload["cutoff"] = (datetime.utcnow() - timedelta(days=swipe_archive.SWIPE_ARCHIVE_AFTER_DAYS)).isoformat()
+    first_user_id = payload.get("next_user_id", 0)
+    last_user_id = first_user_id + SWIPE_ARCHIVE_USERS_PER_BATCH - 1
+    _, resume_user_id = swipe_archive.archive_passes(
+        db, first_user_id, last_user_id, datetime.fromisoformat(payload["cutoff"]), SWIPE_ARCHIVE_ROWS_PER_BATCH
+    )
+    if resume_user_id is not None:
+        payload["next_user_id"] = resume_user_id
+        return True
+    payload["next_user_id"] = last_user_id + 1
+    return last_user_id < (db.query(func.max(models.User.id)).scalar() or 0)
+
+
+# kind -> hours between runs; the worker enqueues these itself.
+PERIODIC_JOBS = {
+    "archive_swipes": int(os.getenv("SWIPE_ARCHIVE_INTERVAL_HOURS", "24")),
+}
+
+
+def schedule_periodic(db: Session):
+    now = datetime.utcnow()
+    for kind, hours in PERIODIC_JOBS.items():
+        recent = db.query(models.Job.id).filter(
+            models.Job.kind == kind,
+            or_(models.Job.status.in_(["pending", "running"]), models.Job.created_at > now - timedelta(hours=hours))
+        ).first()
+        if not recent:
+            enqueue(db, kind, {})
+    db.commit()
+
+
+# --- Worker ---
+
+def _claim_next(db: Session):
+    now = datetime.utcnow()
+    candidate = db.query(models.Job.id, models.Job.status, models.Job.started_at).filter(or_(
+        and_(models.Job.status == "pending", models.Job.run_after <= now),
+        and_(models.Job.status == "running", models.Job.started_at < now - timedelta(seconds=JOB_LEASE_SECONDS)),
+    )).order_by(models.Job.run_after, models.Job.id).first()
+    if not candidate:
+        return None
+
+    # Compare-and-swap on (status, started_at) so concurrent workers never claim the same job.
+    claimed = db.query(models.Job).filter(
+        models.Job.id == candidate.id,
+        models.Job.status == candidate.status,
+        models.Job.started_at.is_(None) if candidate.started_at is None else models.Job.started_at == candidate.started_at,
+    ).update({models.Job.status: "running", models.Job.started_at: now}, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        return None
+    return db.query(models.Job).filter(models.Job.id == candidate.id).first()
+
+
+def run_once(db: Session) -> bool:
+    """Run one batch of the next due job. Returns False if there was nothing to do."""
+    job = _claim_next(db)
+    if not job:
+        return False
+
+    fn = HANDLERS.get(job.kind)
+    try:
+        if fn is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        payload = dict(job.payload or {})
+        more = fn(db, payload)
+    except Exception as exc:
+        db.rollback()
+        job = db.query(models.Job).filter(models.Job.id == job.id).first()
+        job.attempts = (job.attempts or 0) + 1
+        job.last_error = repr(exc)
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+            logger.exception("Job %s (%s) failed permanently", job.id, job.kind)
+        else:
+            job.status = "pending"
+            job.run_after = datetime.utcnow() + timedelta(seconds=2 ** job.attempts)
+            logger.warning("Job %s (%s) failed, retrying: %r", job.id, job.kind, exc)
+        db.commit()
+        return True
+
+    # The batch and the job's progress commit together.
+    if more:
+        # Handlers may record a cursor in the payload to resume from.
+        job.payload = payload
+        job.status = "pending"
+        job.run_after = datetime.utcnow()
+    else:
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+    db.commit()
+    return True
+
+
+def prune_finished(db: Session):
+    cutoff = datetime.utcnow() - timedelta(hours=JOB_RETENTION_HOURS)
+    db.query(models.Job).filter(models.Job.status == "done", models.Job.finished_at < cutoff).delete(
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def run_worker(stop_event: threading.Event = None):
+    stop_event = stop_event or threading.Event()
+    last_housekeeping = None
+    logger.info("Job worker started")
+    while not stop_event.is_set():
+        db = database.SessionLocal()
+        try:
+            if last_housekeeping is None or time.monotonic() - last_housekeeping > 3600:
+                prune_finished(db)
+                schedule_periodic(db)
+                last_housekeeping = time.monotonic()
+            while not stop_event.is_set() and run_once(db):
+                pass
+        except Exception:
+            logger.exception("Job worker error")
+        finally:
+            db.close()
+        stop_event.wait(JOB_POLL_INTERVAL)
+
+
+def get_metrics(db: Session, sample_size: int = 200) -> dict:
+    depth = dict(db.query(models.Job.status, func.count(models.Job.id)).group_by(models.Job.status).all())
+    now = datetime.utcnow()
+    oldest_pending = db.query(func.min(models.Job.created_at)).filter(models.Job.status == "pending").scalar()
+
+    finished = db.query(models.Job.created_at, models.Job.finished_at).filter(
+        models.Job.status == "done"
+    ).order_by(models.Job.finished_at.desc()).limit(sample_size).all()
+    latencies = sorted((finished_at - created_at).total_seconds() for created_at, finished_at in finished)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None
+
+    return {
+        "pending": depth.get("pending", 0),
+        "running": depth.get("running", 0),
+        "failed": depth.get("failed", 0),
+        "done": depth.get("done", 0),
+        "oldest_pending_age_seconds": (now - oldest_pending).total_seconds() if oldest_pending else None,
+        "latency_p50_seconds": percentile(0.5),
+        "latency_p95_seconds": percentile(0.95),
+    }
+
+
+_inline_stop = threading.Event()
+_inline_thread = None
+
+
+def start_inline_worker():
+    global _inline_thread
+    if not JOB_WORKER_INLINE or _inline_thread is not None:
+        return
+    _inline_stop.clear()
+    _inline_thread = threading.Thread(target=run_worker, args=(_inline_stop,), name="job-worker", daemon=True)
+    _inline_thread.start()
+
+
+def stop_inline_worker():
+    global _inline_thread
+    if _inline_thread is None:
+        return
+    _inline_stop.set()
+    _inline_thread.join()
+    _inline_thread = None
+
+
+if __name__ == "__main__":
+    # Standalone worker: python -m backend.jobs (the API process creates the schema)
+    logging.basicConfig(level=logging.INFO)
+    run_worker()
@@ -5,21 +5,41 @@ import uuid
 from datetime import timedelta, datetime
 from typing import List, Optional
 
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas, auth, database
+from . import crud, models, schemas, auth, database, message_buffer, search, etags, jobs
+from .profile_cache import profile_cache
+from .safety_cache import block_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 models.Base.metadata.create_all(bind=database.engine)
+database.add_missing_columns_and_indexes(database.engine, models.Base.metadata)
+database.add_sqlite_autoincrement(database.engine, models.Base.metadata)
+search.init_search_index(database.engine)
 
 app = FastAPI()
 
+@app.on_event("startup")
+def start_background_workers():
+    message_buffer.start()
+    db = database.SessionLocal()
+    try:
+        crud.schedule_safety_stats_backfill(db)
+    finally:
+        db.close()
+    jobs.start_inline_worker()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    message_buffer.stop()
+    jobs.stop_inline_worker()
+
 origins = [
     "http://localhost:5173",
     "http://localhost:3000",
@@ -33,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Sync-Token", "X-Sync-Reset"],
 )
 
 UPLOAD_DIR = "uploads"
@@ -55,7 +76,7 @@ def signup(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
 @app.post("/api/auth/login", response_model=schemas.Token)
 def login(form_data: schemas.UserLogin, db: Session = Depends(database.get_db)):
     user = crud.get_user_by_email(db, email=form_data.email)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    if not user or not user.is_active or not auth.verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -68,9 +89,23 @@ def login(form_data: schemas.UserLogin, db: Session = Depends(database.get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/api/users/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+def read_users_me(
+    request: Request,
+    response: Response,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    etag = etags.make_etag(
+        "me", current_user.id, current_user.email, current_user.is_active, current_user.is_onboarded,
+        current_user.is_verified, current_user.is_admin, crud.get_profile_version(db, current_user.id)
+    )
+    cached = etags.not_modified(request, etag)
+    if cached:
+        return cached
+
     profile = crud.get_user_profile(db, current_user.id)
     current_user.profile = profile
+    etags.set_etag(response, etag)
     return current_user
 
 @app.post("/api/users/me/onboard", response_model=schemas.ProfileResponse)
@@ -91,13 +126,26 @@ def update_profile(
 ):
     return crud.update_user_profile(db, profile, current_user.id)
 
+@app.delete("/api/users/me")
+def delete_account(
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    crud.delete_account(db, current_user.id)
+    return {"status": "scheduled"}
+
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+def upload_file(
+    file: UploadFile = File(...),
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
     file_extension = os.path.splitext(file.filename)[1]
     filename = f"{uuid.uuid4()}{file_extension}"
     file_path = os.path.join(UPLOAD_DIR, filename)
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    crud.record_upload(db, filename, current_user.id)
     return {"url": f"/uploads/{filename}"}
 
 @app.get("/api/users/discovery", response_model=List[schemas.ProfileResponse])
@@ -108,7 +156,9 @@ def get_discovery_profiles(
     db: Session = Depends(database.get_db)
 ):
     # Pass optional gender filter from query param
-    return crud.get_potential_matches(db, current_user.id, limit, gender_filter=gender)
+    profiles = crud.get_potential_matches(db, current_user.id, limit, gender_filter=gender)
+    # Payloads are already-serialized ProfileResponses; skip re-validating them
+    return JSONResponse(profiles)
 
 @app.post("/api/swipes", response_model=schemas.SwipeResponse)
 def create_swipe(
@@ -120,21 +170,65 @@ def create_swipe(
 
 @app.get("/api/matches", response_model=List[schemas.MatchResponse])
 def get_matches(
+    request: Request,
+    since: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    state = crud.get_inbox_state(db, current_user.id)
+    sync_token = etags.encode_sync_token(state)
+    etag = etags.make_etag("matches", current_user.id, since, sorted(state.items()))
+    cached = etags.not_modified(request, etag)
+    if cached:
+        cached.headers["X-Sync-Token"] = sync_token
+        return cached
+
+    headers = {"ETag": etag, "Cache-Control": etags.CACHE_CONTROL, "X-Sync-Token": sync_token}
+    cursor = etags.decode_sync_token(since) if since else None
+    if cursor:
+        max_match_id, max_message_id, digest = cursor
+        # The matches the client already has must be exactly as it saw them: a removed or
+        # reused row, or a partner's profile edit, means it has to replace its list.
+        seen = [row for row in state["matches"] if row[0] <= max_match_id]
+        if etags.inbox_digest(seen) == digest:
+            matches = crud.get_matches_for_user(
+                db, current_user.id, after_match_id=max_match_id, after_message_id=max_message_id
+            )
+            return JSONResponse(matches, headers=headers)
+    if since:
+        headers["X-Sync-Reset"] = "1"
+    # Rows are assembled from cached, already-serialized profiles; skip re-validating them
+    return JSONResponse(crud.get_matches_for_user(db, current_user.id), headers=headers)
+
+@app.get("/api/matches/search", response_model=List[schemas.SearchResult])
+def search_matches(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
-    return crud.get_matches_for_user(db, current_user.id)
+    return search.search_matches(db, current_user.id, q, limit, offset)
 
 @app.get("/api/matches/{match_id}/messages", response_model=List[schemas.MessageResponse])
 def get_messages(
     match_id: int,
+    request: Request,
+    response: Response,
     limit: int = 50,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
-    match = db.query(models.Match).filter(models.Match.id == match_id).first()
+    match = db.query(models.Match).filter(models.Match.id == match_id, models.Match.deleted_at.is_(None)).first()
     if not match or (match.user1_id != current_user.id and match.user2_id != current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized")
+
+    etag = etags.make_etag("messages", match_id, limit, crud.get_messages_state(db, match_id))
+    cached = etags.not_modified(request, etag)
+    if cached:
+        return cached
+
+    etags.set_etag(response, etag)
     return crud.get_messages(db, match_id, limit)
 
 @app.post("/api/matches/{match_id}/messages", response_model=schemas.MessageResponse)
@@ -178,6 +272,64 @@ def unmatch(
         raise HTTPException(status_code=400, detail="Failed to unmatch")
     return {"status": "success"}
 
+# --- Admin Routes ---
+
+@app.get("/api/admin/jobs/metrics")
+def job_metrics(
+    current_user: models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(database.get_db)
+):
+    return jobs.get_metrics(db)
+
+@app.get("/api/admin/cache/metrics")
+def cache_metrics(current_user: models.User = Depends(auth.get_current_admin)):
+    return {
+        "profiles": profile_cache.metrics(),
+        "blocks": {"hits": block_cache.hits, "loads": block_cache.loads},
+    }
+
+ADMIN_PAGE_MAX = 100
+
+def _admin_page_size(limit: int) -> int:
+    return max(1, min(limit, ADMIN_PAGE_MAX))
+
+@app.get("/api/admin/reports/top", response_model=schemas.AdminUserSafetyPage)
+def most_reported_users(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(database.get_db)
+):
+    return crud.get_most_reported_users(db, _admin_page_size(limit), cursor, by="reports")
+
+@app.get("/api/admin/blocks/top", response_model=schemas.AdminUserSafetyPage)
+def most_blocked_users(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(database.get_db)
+):
+    return crud.get_most_reported_users(db, _admin_page_size(limit), cursor, by="blocks")
+
+@app.get("/api/admin/reports", response_model=schemas.ReportPage)
+def recent_reports(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    reported_id: Optional[int] = None,
+    current_user: models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(database.get_db)
+):
+    return crud.get_recent_reports(db, _admin_page_size(limit), cursor, reported_id)
+
+@app.post("/api/admin/safety-stats/refresh")
+def refresh_safety_stats(
+    current_user: models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(database.get_db)
+):
+    job = jobs.enqueue(db, "refresh_safety_stats", {})
+    db.commit()
+    return {"status": "scheduled", "job_id": job.id}
+
 # --- Static Files / Frontend ---
 cwd = os.getcwd()
 dist_path = os.path.join(cwd, "dist")
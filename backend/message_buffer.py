@@ -0,0 +1,273 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, insert, text
+
+from . import models, database
+
+logger = logging.getLogger(__name__)
+
+# "sync" commits every message inline (original behaviour), "buffered" enables write-behind.
+MESSAGE_WRITE_MODE = os.getenv("MESSAGE_WRITE_MODE", "sync")
+MESSAGE_FLUSH_INTERVAL_MS = int(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "5"))
+MESSAGE_FLUSH_MAX_BATCH = int(os.getenv("MESSAGE_FLUSH_MAX_BATCH", "500"))
+# "commit": the sender waits until the group commit containing its message succeeds.
+# "enqueue": the sender returns as soon as the message is queued; a crash can lose
+# up to one flush interval of messages.
+MESSAGE_DURABILITY = os.getenv("MESSAGE_DURABILITY", "commit")
+MESSAGE_COMMIT_TIMEOUT = float(os.getenv("MESSAGE_COMMIT_TIMEOUT", "5"))
+# In "enqueue" mode a row that keeps failing is moved to the dead-letter list after
+# this many flush attempts instead of blocking the messages queued behind it.
+MESSAGE_FLUSH_MAX_ATTEMPTS = int(os.getenv("MESSAGE_FLUSH_MAX_ATTEMPTS", "3"))
+MESSAGE_DEAD_LETTER_SIZE = int(os.getenv("MESSAGE_DEAD_LETTER_SIZE", "1000"))
+# Upper bound on how long stop() keeps draining the queue at shutdown.
+MESSAGE_DRAIN_TIMEOUT = float(os.getenv("MESSAGE_DRAIN_TIMEOUT", "10"))
+# Longest the flusher waits between attempts while flushes keep failing.
+MESSAGE_RETRY_MAX_DELAY = float(os.getenv("MESSAGE_RETRY_MAX_DELAY", "1"))
+
+
+class MessageFlushError(Exception):
+    pass
+
+
+class _PendingMessage:
+    __slots__ = ("row", "done", "error", "attempts")
+
+    def __init__(self, row: dict):
+        self.row = row
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+        self.attempts = 0
+
+
+class MessageWriteBuffer:
+    """Append-only queue of validated messages flushed to the DB in group commits.
+
+    Ids are handed out from an in-process counter seeded from MAX(messages.id),
+    so buffered mode assumes this process is the only writer of `messages`
+    (a single uvicorn worker, which is how the app is deployed).
+    """
+
+    def __init__(self, session_factory=database.SessionLocal,
+                 interval_ms: int = MESSAGE_FLUSH_INTERVAL_MS,
+                 max_batch: int = MESSAGE_FLUSH_MAX_BATCH,
+                 durability: str = MESSAGE_DURABILITY):
+        if durability not in ("commit", "enqueue"):
+            raise ValueError(f"Unknown message durability: {durability}")
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.durability = durability
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._queue = deque()
+        self._inflight: List[_PendingMessage] = []
+        self._next_id = 0
+        self._thread: Optional[threading.Thread] = None
+        self._retry_delay = 0.0
+        # Rows given up on in "enqueue" mode, newest last.
+        self.dead_letters = deque(maxlen=MESSAGE_DEAD_LETTER_SIZE)
+
+    def start(self):
+        db = self.session_factory()
+        try:
+            # Past deleted rows as well, so no id is ever handed out twice.
+            last_id = max(
+                db.query(func.max(models.Message.id)).scalar() or 0,
+                database.last_issued_id(db.connection(), models.Message.__tablename__)
+            )
+            self._next_id = last_id + 1
+        finally:
+            db.close()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="message-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Drain anything queued after the flusher exited. Failing rows run out of
+        # attempts, but bound the loop anyway so shutdown can't hang on a dead DB.
+        deadline = time.monotonic() + MESSAGE_DRAIN_TIMEOUT
+        while self._queue and time.monotonic() < deadline:
+            self.flush()
+        with self._lock:
+            abandoned = list(self._queue)
+            self._queue.clear()
+        if abandoned:
+            logger.error("Dropping %d buffered messages that could not be flushed at shutdown", len(abandoned))
+            for p in abandoned:
+                self._give_up(p, MessageFlushError("Not flushed before shutdown"))
+        self._sync_id_sequence()
+
+    def submit(self, match_id: int, sender_id: int, text: str) -> models.Message:
+        with self._lock:
+            row = {
+                "id": self._next_id,
+                "match_id": match_id,
+                "sender_id": sender_id,
+                "text": text,
+                "timestamp": datetime.utcnow(),
+                "is_read": False,
+            }
+            self._next_id += 1
+            pending = _PendingMessage(row)
+            self._queue.append(pending)
+
+        if len(self._queue) >= self.max_batch:
+            self._wakeup.set()
+
+        if self.durability == "commit":
+            if not pending.done.wait(MESSAGE_COMMIT_TIMEOUT):
+                with self._lock:
+                    try:
+                        self._queue.remove(pending)
+                        cancelled = True
+                    except ValueError:
+                        cancelled = False
+                if cancelled:
+                    # Never written, so the client can safely retry.
+                    raise MessageFlushError("Timed out waiting for message commit")
+                # Already in a flush: its outcome is about to be known, so report that.
+                pending.done.wait()
+            if pending.error:
+                raise MessageFlushError(str(pending.error))
+
+        return models.Message(**row)
+
+    def pending_for_match(self, match_id: int) -> List[models.Message]:
+        with self._lock:
+            entries = self._inflight + list(self._queue)
+        return [models.Message(**p.row) for p in entries if p.row["match_id"] == match_id]
+
+    def first_pending_id(self) -> Optional[int]:
+        """Lowest id not yet committed, or None if nothing is pending."""
+        # Ids are queued in order and retries go back to the front, so only the heads matter.
+        with self._lock:
+            heads = self._inflight[:1] + ([self._queue[0]] if self._queue else [])
+        return min((p.row["id"] for p in heads), default=None)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self._retry_delay or self.interval)
+            self._wakeup.clear()
+            while self._queue and not self._stopping.is_set():
+                if not self.flush():
+                    break
+
+    def flush(self) -> bool:
+        """Write one batch. Returns False if any row in it failed."""
+        with self._lock:
+            batch = []
+            while self._queue and len(batch) < self.max_batch:
+                batch.append(self._queue.popleft())
+            self._inflight = batch
+        if not batch:
+            return True
+
+        error = self._write([p.row for p in batch])
+        if error is None:
+            failed = []
+        elif len(batch) == 1:
+            failed = [(batch[0], error)]
+        else:
+            # Retry row by row so one bad row doesn't hold back the rest of the batch.
+            logger.warning("Failed to flush %d buffered messages, retrying one by one: %r", len(batch), error)
+            failed = []
+            for p in batch:
+                row_error = self._write([p.row])
+                if row_error is not None:
+                    failed.append((p, row_error))
+
+        failed_ids = {id(p) for p, _ in failed}
+        retry = []
+        for p, exc in failed:
+            p.attempts += 1
+            if self.durability == "enqueue" and p.attempts < MESSAGE_FLUSH_MAX_ATTEMPTS:
+                retry.append(p)
+            else:
+                self._give_up(p, exc)
+
+        with self._lock:
+            self._inflight = []
+            # Nobody is waiting on these; keep them for the next flush.
+            self._queue.extendleft(reversed(retry))
+        for p in batch:
+            if id(p) not in failed_ids:
+                p.done.set()
+
+        if failed:
+            self._retry_delay = min(max(self._retry_delay * 2, self.interval * 2), MESSAGE_RETRY_MAX_DELAY)
+            return False
+        self._retry_delay = 0.0
+        return True
+
+    def _write(self, rows: List[dict]) -> Optional[Exception]:
+        latest = {}
+        for row in rows:
+            latest[row["match_id"]] = max(latest.get(row["match_id"], row["timestamp"]), row["timestamp"])
+
+        db = self.session_factory()
+        try:
+            db.execute(insert(models.Message), rows)
+            for match_id, timestamp in latest.items():
+                db.query(models.Match).filter(models.Match.id == match_id).update(
+                    {models.Match.timestamp: timestamp}, synchronize_session=False
+                )
+            db.commit()
+            return None
+        except Exception as exc:
+            db.rollback()
+            return exc
+        finally:
+            db.close()
+
+    def _give_up(self, pending: _PendingMessage, exc: Exception):
+        pending.error = exc
+        pending.done.set()
+        if self.durability == "enqueue":
+            # The sender was already told the message was sent.
+            self.dead_letters.append(pending.row)
+            logger.error("Dropped buffered message %s for match %s after %d attempts: %r",
+                         pending.row["id"], pending.row["match_id"], pending.attempts, exc)
+
+    def _sync_id_sequence(self):
+        # Explicit ids do not advance the Postgres sequence used by the sync path.
+        if database.engine.dialect.name != "postgresql":
+            return
+        with database.engine.begin() as conn:
+            conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('messages', 'id'), "
+                "GREATEST(COALESCE((SELECT MAX(id) FROM messages), 1), :last_id))"
+            ), {"last_id": self._next_id - 1})
+
+
+buffer: Optional[MessageWriteBuffer] = None
+
+
+def start():
+    global buffer
+    if MESSAGE_WRITE_MODE != "buffered" or buffer is not None:
+        return
+    buffer = MessageWriteBuffer()
+    buffer.start()
+    logger.info("Message write-behind enabled (interval=%sms, durability=%s)",
+                MESSAGE_FLUSH_INTERVAL_MS, MESSAGE_DURABILITY)
+
+
+def stop():
+    global buffer
+    if buffer is None:
+        return
+    buffer.stop()
+    buffer = None
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, JSON, DateTime, Text, Float
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, JSON, DateTime, Text, Float, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -30,7 +30,7 @@ class Profile(Base):
     __tablename__ = "profiles"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     # Basic
     name = Column(String)
@@ -56,10 +56,28 @@ class Profile(Base):
     images = Column(JSON, default=list)
     interests = Column(JSON, default=list)
 
+    # Bumped on every update; used for ETags and delta sync
+    version = Column(Integer, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     user = relationship("User", back_populates="profile")
 
+class Upload(Base):
+    """Who uploaded each file in uploads/, so account deletion only removes that user's files."""
+    __tablename__ = "uploads"
+
+    filename = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Swipe(Base):
     __tablename__ = "swipes"
+    # Covers "has user swiped target" and the reciprocal-like lookup in create_swipe;
+    # target_id alone is used when an account is deleted
+    __table_args__ = (
+        Index("ix_swipes_user_target", "user_id", "target_id"),
+        Index("ix_swipes_target_id", "target_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -69,13 +87,26 @@ class Swipe(Base):
 
     user = relationship("User", foreign_keys=[user_id], back_populates="swipes")
 
+class SwipeArchive(Base):
+    """Cold tier for old passes: one compressed, sorted id set per user (see swipe_archive.py)."""
+    __tablename__ = "swipe_archives"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    passed_ids = Column(LargeBinary)
+    count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Match(Base):
     __tablename__ = "matches"
+    # Ids are delta-sync cursors; SQLite would otherwise reuse the highest id after a delete
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
-    user1_id = Column(Integer, ForeignKey("users.id"))
-    user2_id = Column(Integer, ForeignKey("users.id"))
+    user1_id = Column(Integer, ForeignKey("users.id"), index=True)
+    user2_id = Column(Integer, ForeignKey("users.id"), index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # Set on unmatch/block/account deletion; the row and its messages are removed by a background job
+    deleted_at = Column(DateTime, nullable=True)
 
     user1 = relationship("User", foreign_keys=[user1_id], back_populates="matches_as_user1")
     user2 = relationship("User", foreign_keys=[user2_id], back_populates="matches_as_user2")
@@ -83,9 +114,10 @@ class Match(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
-    match_id = Column(Integer, ForeignKey("matches.id"))
+    match_id = Column(Integer, ForeignKey("matches.id"), index=True)
     sender_id = Column(Integer, ForeignKey("users.id"))
     text = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -98,8 +130,8 @@ class Report(Base):
     __tablename__ = "reports"
 
     id = Column(Integer, primary_key=True, index=True)
-    reporter_id = Column(Integer, ForeignKey("users.id"))
-    reported_id = Column(Integer, ForeignKey("users.id"))
+    reporter_id = Column(Integer, ForeignKey("users.id"), index=True)
+    reported_id = Column(Integer, ForeignKey("users.id"), index=True)
     reason = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
@@ -109,8 +141,36 @@ class Block(Base):
     __tablename__ = "blocks"
 
     id = Column(Integer, primary_key=True, index=True)
-    blocker_id = Column(Integer, ForeignKey("users.id"))
-    blocked_id = Column(Integer, ForeignKey("users.id"))
+    blocker_id = Column(Integer, ForeignKey("users.id"), index=True)
+    blocked_id = Column(Integer, ForeignKey("users.id"), index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     blocker = relationship("User", foreign_keys=[blocker_id], back_populates="blocks_made")
+
+class UserSafetyStats(Base):
+    """Per-user moderation counters, maintained on every report/block for the admin dashboard."""
+    __tablename__ = "user_safety_stats"
+    __table_args__ = (
+        Index("ix_user_safety_stats_reports", "reports_received", "user_id"),
+        Index("ix_user_safety_stats_blocks", "blocks_received", "user_id"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    reports_received = Column(Integer, default=0, nullable=False)
+    blocks_received = Column(Integer, default=0, nullable=False)
+    last_reported_at = Column(DateTime, nullable=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)
+    payload = Column(JSON, default=dict)
+    status = Column(String, default="pending") # pending, running, done, failed
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    run_after = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "20000"))
+
+
+class ProfileCache:
+    """Bounded LRU of serialized ProfileResponse payloads, keyed by user_id and checked against version.
+
+    Callers pass the version they just read with their own query, so an entry is
+    only served for the exact profile row version it was built from; entries
+    from before an update (in this or another process) are simply misses.
+    `update_user_profile` also invalidates eagerly to free the slot.
+    """
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, db: Session, versions: Dict[int, Optional[int]]) -> Dict[int, dict]:
+        """Multi-get payloads for {user_id: version}; misses are loaded with one query."""
+        found = {}
+        with self._lock:
+            for user_id, version in versions.items():
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+            self.hits += len(found)
+            self.misses += len(versions) - len(found)
+
+        missing = [user_id for user_id in versions if user_id not in found]
+        if missing:
+            loaded = db.query(models.Profile).filter(models.Profile.user_id.in_(missing)).all()
+            with self._lock:
+                for profile in loaded:
+                    payload = schemas.ProfileResponse.model_validate(profile).model_dump(mode="json")
+                    found[profile.user_id] = payload
+                    self._entries[profile.user_id] = (profile.version, payload)
+                    self._entries.move_to_end(profile.user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return found
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,73 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import FrozenSet
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from . import models
+
+BLOCK_CACHE_MAX_USERS = int(os.getenv("BLOCK_CACHE_MAX_USERS", "50000"))
+
+
+class BlockCache:
+    """Per-user set of ids that must never be shown to that user, in either direction.
+
+    A user's set is loaded with one query the first time it's needed and kept
+    up to date by `add`, so discovery and the inbox can check blocks in memory.
+    The cache is per process; blocks written by another process are only seen
+    after the entry is evicted.
+    """
+
+    def __init__(self, max_users: int = BLOCK_CACHE_MAX_USERS):
+        self.max_users = max_users
+        self._sets: "OrderedDict[int, FrozenSet[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, db: Session, user_id: int) -> FrozenSet[int]:
+        with self._lock:
+            blocked = self._sets.get(user_id)
+            if blocked is not None:
+                self._sets.move_to_end(user_id)
+                self.hits += 1
+                return blocked
+            generation = self._generation
+
+        rows = db.query(models.Block.blocker_id, models.Block.blocked_id).filter(
+            or_(models.Block.blocker_id == user_id, models.Block.blocked_id == user_id)
+        ).all()
+        blocked = frozenset(blocked_id if blocker_id == user_id else blocker_id for blocker_id, blocked_id in rows)
+
+        with self._lock:
+            self.loads += 1
+            if generation != self._generation:
+                # A block landed while we were loading; don't cache a possibly stale set.
+                return blocked
+            self._sets[user_id] = blocked
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+        return blocked
+
+    def add(self, blocker_id: int, blocked_id: int):
+        with self._lock:
+            self._generation += 1
+            for user_id, other_id in ((blocker_id, blocked_id), (blocked_id, blocker_id)):
+                blocked = self._sets.get(user_id)
+                if blocked is not None:
+                    self._sets[user_id] = blocked | {other_id}
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._sets.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+
+block_cache = BlockCache()
@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import exists, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def bump(db: Session, user_id: int, reports: int = 0, blocks: int = 0, reported_at: Optional[datetime] = None):
+    """Adjust a user's moderation counters inside the caller's transaction."""
+    Stats = models.UserSafetyStats
+    values = {
+        Stats.reports_received: Stats.reports_received + reports,
+        Stats.blocks_received: Stats.blocks_received + blocks,
+    }
+    if reported_at:
+        values[Stats.last_reported_at] = reported_at
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        # One upsert, so two first reports/blocks against the same user can't both insert.
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        db.execute(insert(Stats).values(
+            user_id=user_id,
+            reports_received=max(reports, 0),
+            blocks_received=max(blocks, 0),
+            last_reported_at=reported_at,
+        ).on_conflict_do_update(
+            index_elements=[Stats.user_id],
+            set_={column.key: value for column, value in values.items()},
+        ))
+        return
+
+    updated = db.query(Stats).filter(Stats.user_id == user_id).update(values, synchronize_session=False)
+    if not updated:
+        db.add(Stats(
+            user_id=user_id,
+            reports_received=max(reports, 0),
+            blocks_received=max(blocks, 0),
+            last_reported_at=reported_at,
+        ))
+        db.flush()
+
+
+def recompute(db: Session, first_user_id: int, last_user_id: int):
+    """Rebuild the counters for a range of user ids from `reports` and `blocks`.
+
+    Counts are read and written by the same statement, and existing rows are
+    locked first, so a report or block landing meanwhile is neither lost nor
+    counted twice.
+    """
+    Stats = models.UserSafetyStats
+    in_range = Stats.user_id.between(first_user_id, last_user_id)
+    db.query(Stats.user_id).filter(in_range).with_for_update().all()
+
+    reported = models.Report.reported_id == models.User.id
+    blocked = models.Block.blocked_id == models.User.id
+    report_count = select(func.count(models.Report.id)).where(reported).scalar_subquery()
+    block_count = select(func.count(models.Block.id)).where(blocked).scalar_subquery()
+    last_reported_at = select(func.max(models.Report.timestamp)).where(reported).scalar_subquery()
+    counts = select(models.User.id, report_count, block_count, last_reported_at).where(
+        models.User.id.between(first_user_id, last_user_id),
+        or_(exists().where(reported), exists().where(blocked))
+    )
+    columns = [Stats.user_id, Stats.reports_received, Stats.blocks_received, Stats.last_reported_at]
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(Stats).from_select(columns, counts)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[Stats.user_id],
+            set_={column.key: statement.excluded[column.key] for column in columns[1:]},
+        ))
+    else:
+        db.query(Stats).filter(in_range).delete(synchronize_session=False)
+        db.execute(Stats.__table__.insert().from_select(columns, counts))
+
+    # Users with nothing left against them drop out of the dashboard.
+    db.query(Stats).filter(
+        in_range,
+        ~exists().where(models.Report.reported_id == Stats.user_id),
+        ~exists().where(models.Block.blocked_id == Stats.user_id)
+    ).delete(synchronize_session=False)
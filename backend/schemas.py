@@ -92,9 +92,44 @@ class MatchResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class SearchResult(BaseModel):
+    match_id: int
+    user_id: int
+    name: Optional[str] = None
+    message: Optional[MessageResponse] = None
+    snippet: Optional[str] = None
+
 class ReportCreate(BaseModel):
     reported_id: int
     reason: str
 
 class BlockCreate(BaseModel):
     blocked_id: int
+
+# --- Admin Schemas ---
+
+class AdminUserSafety(BaseModel):
+    user_id: int
+    email: Optional[str] = None
+    name: Optional[str] = None
+    reports_received: int
+    blocks_received: int
+    last_reported_at: Optional[datetime] = None
+
+class AdminUserSafetyPage(BaseModel):
+    items: List[AdminUserSafety]
+    next_cursor: Optional[str] = None
+
+class ReportResponse(BaseModel):
+    id: int
+    reporter_id: Optional[int] = None
+    reported_id: int
+    reason: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ReportPage(BaseModel):
+    items: List[ReportResponse]
+    next_cursor: Optional[str] = None
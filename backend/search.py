@@ -0,0 +1,208 @@
+import re
+import logging
+from typing import List
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .safety_cache import block_cache
+
+logger = logging.getLogger(__name__)
+
+# SQLite: FTS5 tables over messages.text and profiles.name, kept in sync by triggers so
+# every write path (crud.create_message, the write-behind buffer, profile updates,
+# cascading deletes) maintains them incrementally. Each message is also indexed with a
+# "m<match_id>" token, and each profile with a "u<user_id>" token, so a search can be
+# scoped to the caller's matches inside the index.
+SQLITE_SETUP = [
+    """CREATE VIEW IF NOT EXISTS messages_fts_content AS
+       SELECT id, text, 'm' || match_id AS match_key FROM messages""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+       text, match_key, content='messages_fts_content', content_rowid='id',
+       tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+       INSERT INTO messages_fts(rowid, text, match_key) VALUES (new.id, new.text, 'm' || new.match_id);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+       INSERT INTO messages_fts(messages_fts, rowid, text, match_key) VALUES ('delete', old.id, old.text, 'm' || old.match_id);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF text, match_id ON messages BEGIN
+       INSERT INTO messages_fts(messages_fts, rowid, text, match_key) VALUES ('delete', old.id, old.text, 'm' || old.match_id);
+       INSERT INTO messages_fts(rowid, text, match_key) VALUES (new.id, new.text, 'm' || new.match_id);
+       END""",
+    """CREATE VIEW IF NOT EXISTS profiles_fts_content AS
+       SELECT id, name, 'u' || user_id AS user_key FROM profiles""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS profiles_fts USING fts5(
+       name, user_key, content='profiles_fts_content', content_rowid='id',
+       tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS profiles_fts_ai AFTER INSERT ON profiles BEGIN
+       INSERT INTO profiles_fts(rowid, name, user_key) VALUES (new.id, new.name, 'u' || new.user_id);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS profiles_fts_ad AFTER DELETE ON profiles BEGIN
+       INSERT INTO profiles_fts(profiles_fts, rowid, name, user_key) VALUES ('delete', old.id, old.name, 'u' || old.user_id);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS profiles_fts_au AFTER UPDATE OF name, user_id ON profiles BEGIN
+       INSERT INTO profiles_fts(profiles_fts, rowid, name, user_key) VALUES ('delete', old.id, old.name, 'u' || old.user_id);
+       INSERT INTO profiles_fts(rowid, name, user_key) VALUES (new.id, new.name, 'u' || new.user_id);
+       END""",
+]
+
+# Postgres: GIN expression indexes, maintained by Postgres itself on every write.
+POSTGRES_SETUP = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_text_fts ON messages USING GIN (to_tsvector('simple', coalesce(text, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_profiles_name_fts ON profiles USING GIN (to_tsvector('simple', coalesce(name, '')))",
+]
+
+SEARCH_MAX_LIMIT = 50
+
+
+def init_search_index(engine):
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            existing = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE name IN ('messages_fts', 'profiles_fts')"
+            )).scalars().all()
+            for statement in SQLITE_SETUP:
+                conn.execute(text(statement))
+            # Index rows written before the FTS tables existed.
+            if "messages_fts" not in existing:
+                conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+            if "profiles_fts" not in existing:
+                conn.execute(text("INSERT INTO profiles_fts(profiles_fts) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for statement in POSTGRES_SETUP:
+                conn.execute(text(statement))
+        else:
+            logger.warning("Full-text search is not supported on %s", dialect)
+
+
+def _fts5_terms(query: str) -> List[str]:
+    # Quote every word so user input can't inject FTS5 operators.
+    return ['"' + word.replace('"', '""') + '"' for word in re.findall(r"\w+", query)]
+
+
+def _visible_matches(db: Session, user_id: int):
+    blocked_ids = block_cache.get(db, user_id)
+    rows = db.query(models.Match.id, models.Match.user1_id, models.Match.user2_id).filter(
+        or_(models.Match.user1_id == user_id, models.Match.user2_id == user_id),
+        models.Match.deleted_at.is_(None)
+    ).all()
+    partners = {}
+    for match_id, user1_id, user2_id in rows:
+        other_id = user2_id if user1_id == user_id else user1_id
+        if other_id not in blocked_ids:
+            partners[match_id] = other_id
+    return partners
+
+
+def search_matches(db: Session, user_id: int, query: str, limit: int = 20, offset: int = 0):
+    """Search the caller's matches by partner name, then their messages.
+
+    Name hits come first, then message hits newest first. Results are not
+    ordered by bm25 because bm25 needs document counts for every term, which
+    means reading the term's full doclist across all users instead of just the
+    caller's slice of the index. `limit`/`offset` page
+    through the combined list.
+    """
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    partners = _visible_matches(db, user_id)
+    if not partners or not query.strip():
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        terms = _fts5_terms(query)
+        if not terms:
+            return []
+        name_hits = _sqlite_name_hits(db, partners, " ".join(terms))
+    elif dialect == "postgresql":
+        name_hits = _postgres_name_hits(db, partners, query)
+    else:
+        return []
+
+    results = name_hits[offset:offset + limit]
+    remaining = limit - len(results)
+    if remaining > 0:
+        message_offset = max(0, offset - len(name_hits))
+        if dialect == "sqlite":
+            message_hits = _sqlite_message_hits(db, partners, " ".join(terms), remaining, message_offset)
+        else:
+            message_hits = _postgres_message_hits(db, partners, query, remaining, message_offset)
+        results.extend(message_hits)
+
+    if not results:
+        return results
+
+    names = dict(db.query(models.Profile.user_id, models.Profile.name).filter(
+        models.Profile.user_id.in_({r["user_id"] for r in results})
+    ).all())
+    for r in results:
+        r["name"] = names.get(r["user_id"])
+    return results
+
+
+def _sqlite_name_hits(db: Session, partners, match_query: str):
+    match_by_user = {other_id: match_id for match_id, other_id in partners.items()}
+    user_keys = " OR ".join(f'"u{user_id}"' for user_id in match_by_user)
+    rows = db.execute(text(
+        "SELECT profiles.user_id FROM profiles_fts "
+        "JOIN profiles ON profiles.id = profiles_fts.rowid "
+        "WHERE profiles_fts MATCH :q ORDER BY profiles_fts.rowid"
+    ), {"q": f"user_key:({user_keys}) AND name:({match_query})"}).scalars().all()
+    return [
+        {"match_id": match_by_user[user_id], "user_id": user_id, "message": None, "snippet": None}
+        for user_id in rows if user_id in match_by_user
+    ]
+
+
+def _sqlite_message_hits(db: Session, partners, match_query: str, limit: int, offset: int):
+    match_keys = " OR ".join(f'"m{match_id}"' for match_id in partners)
+    rows = db.execute(text(
+        "SELECT rowid, snippet(messages_fts, 0, '[', ']', '...', 12) "
+        "FROM messages_fts WHERE messages_fts MATCH :q ORDER BY rowid DESC LIMIT :limit OFFSET :offset"
+    ), {"q": f"match_key:({match_keys}) AND text:({match_query})", "limit": limit, "offset": offset}).all()
+    return _message_results(db, partners, rows)
+
+
+def _postgres_name_hits(db: Session, partners, query: str):
+    match_by_user = {other_id: match_id for match_id, other_id in partners.items()}
+    rows = db.execute(text(
+        "SELECT user_id FROM profiles, plainto_tsquery('simple', :q) q "
+        "WHERE to_tsvector('simple', coalesce(name, '')) @@ q AND user_id = ANY(:user_ids) "
+        "ORDER BY ts_rank(to_tsvector('simple', coalesce(name, '')), q) DESC"
+    ), {"q": query, "user_ids": list(match_by_user)}).scalars().all()
+    return [
+        {"match_id": match_by_user[user_id], "user_id": user_id, "message": None, "snippet": None}
+        for user_id in rows
+    ]
+
+
+def _postgres_message_hits(db: Session, partners, query: str, limit: int, offset: int):
+    rows = db.execute(text(
+        "SELECT id, ts_headline('simple', coalesce(text, ''), q, 'StartSel=[,StopSel=],MaxWords=12,MinWords=4') "
+        "FROM messages, plainto_tsquery('simple', :q) q "
+        "WHERE to_tsvector('simple', coalesce(text, '')) @@ q AND match_id = ANY(:match_ids) "
+        "ORDER BY id DESC LIMIT :limit OFFSET :offset"
+    ), {"q": query, "match_ids": list(partners), "limit": limit, "offset": offset}).all()
+    return _message_results(db, partners, rows)
+
+
+def _message_results(db: Session, partners, rows):
+    messages = {m.id: m for m in db.query(models.Message).filter(
+        models.Message.id.in_([row[0] for row in rows])
+    ).all()}
+    results = []
+    for message_id, snippet in rows:
+        message = messages.get(message_id)
+        if not message:
+            continue
+        results.append({
+            "match_id": message.match_id,
+            "user_id": partners[message.match_id],
+            "message": message,
+            "snippet": snippet,
+        })
+    return results
@@ -0,0 +1,172 @@
+import os
+import zlib
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from itertools import accumulate
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Passes older than this move from `swipes` into the per-user archive.
+SWIPE_ARCHIVE_AFTER_DAYS = int(os.getenv("SWIPE_ARCHIVE_AFTER_DAYS", "30"))
+# Decoded archives kept in memory, bounded by the total number of ids (4 bytes each).
+SWIPE_ARCHIVE_CACHE_IDS = int(os.getenv("SWIPE_ARCHIVE_CACHE_IDS", "5000000"))
+
+
+def encode(target_ids: Iterable[int]) -> bytes:
+    """Sorted ids -> zlib-compressed array of gaps (small numbers compress well)."""
+    gaps = array("I")
+    previous = 0
+    for target_id in sorted(set(target_ids)):
+        gaps.append(target_id - previous)
+        previous = target_id
+    return zlib.compress(gaps.tobytes())
+
+
+def decode(blob: bytes) -> array:
+    gaps = array("I")
+    if blob:
+        gaps.frombytes(zlib.decompress(blob))
+    return array("I", accumulate(gaps))
+
+
+class _DecodedCache:
+    """LRU of decoded archives, keyed by user_id and checked against (updated_at, count).
+
+    Decoding a large archive takes milliseconds, and discovery and create_swipe
+    need it on every call while the archive itself changes about once a day.
+    """
+
+    def __init__(self, max_ids: int = SWIPE_ARCHIVE_CACHE_IDS):
+        self.max_ids = max_ids
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, stamp):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != stamp:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: int, stamp, passed: array):
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self._size -= len(old[1])
+            if len(passed) > self.max_ids:
+                return
+            self._entries[user_id] = (stamp, passed)
+            self._size += len(passed)
+            while self._size > self.max_ids:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+decoded_cache = _DecodedCache()
+
+
+def archived_passes(db: Session, user_id: int) -> array:
+    """Sorted ids the user passed on whose swipes have been archived. Treat as read-only."""
+    Archive = models.SwipeArchive
+    stamp = db.query(Archive.updated_at, Archive.count).filter(Archive.user_id == user_id).first()
+    if not stamp:
+        return array("I")
+    stamp = tuple(stamp)
+    passed = decoded_cache.get(user_id, stamp)
+    if passed is None:
+        blob = db.query(Archive.passed_ids).filter(Archive.user_id == user_id).scalar()
+        passed = decode(blob)
+        decoded_cache.put(user_id, stamp, passed)
+    return passed
+
+
+def contains(passed: array, target_id: int) -> bool:
+    i = bisect_left(passed, target_id)
+    return i < len(passed) and passed[i] == target_id
+
+
+def between(passed: array, first_id: int, last_id: int) -> set:
+    """The archived ids in [first_id, last_id]."""
+    return set(passed[bisect_left(passed, first_id):bisect_right(passed, last_id)])
+
+
+def run_end(passed: array, first_id: int) -> int:
+    """Highest id h such that first_id..h are all archived, or first_id - 1 if first_id isn't."""
+    start = bisect_left(passed, first_id)
+    if start == len(passed) or passed[start] != first_id:
+        return first_id - 1
+    # Ids are distinct and sorted, so passed[i] - i never decreases and is
+    # constant exactly across a run of consecutive ids.
+    lo, hi = start, len(passed) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if passed[mid] - mid == first_id - start:
+            lo = mid
+        else:
+            hi = mid - 1
+    return passed[lo]
+
+
+def is_archived_pass(db: Session, user_id: int, target_id: int) -> bool:
+    return contains(archived_passes(db, user_id), target_id)
+
+
+def archive_passes(db: Session, first_user_id: int, last_user_id: int, cutoff: datetime,
+                   max_rows: Optional[int] = None) -> Tuple[int, Optional[int]]:
+    """Move passes older than `cutoff` for a range of users into their archives.
+
+    Runs inside the caller's transaction so the hot rows and the archive change together.
+    At most `max_rows` swipes are moved per call. Returns (swipes archived, user id to
+    resume from), where the resume id is None once the whole range is done.
+    """
+    query = db.query(models.Swipe.id, models.Swipe.user_id, models.Swipe.target_id).filter(
+        models.Swipe.user_id.between(first_user_id, last_user_id),
+        models.Swipe.is_like == False,
+        models.Swipe.timestamp < cutoff
+    )
+    if max_rows is not None:
+        # (user_id, target_id) is the order of ix_swipes_user_target, so no sort is needed.
+        query = query.order_by(models.Swipe.user_id, models.Swipe.target_id).limit(max_rows)
+    rows = query.all()
+    if not rows:
+        return 0, None
+
+    by_user = {}
+    for _, user_id, target_id in rows:
+        by_user.setdefault(user_id, []).append(target_id)
+
+    archives = {a.user_id: a for a in db.query(models.SwipeArchive).filter(
+        models.SwipeArchive.user_id.in_(list(by_user))
+    ).all()}
+    now = datetime.utcnow()
+    for user_id, target_ids in by_user.items():
+        archive = archives.get(user_id)
+        if archive:
+            merged = set(decode(archive.passed_ids))
+            merged.update(target_ids)
+            archive.passed_ids = encode(merged)
+            archive.count = len(merged)
+            archive.updated_at = now
+        else:
+            db.add(models.SwipeArchive(user_id=user_id, passed_ids=encode(target_ids), count=len(set(target_ids)), updated_at=now))
+
+    swipe_ids = [row[0] for row in rows]
+    for start in range(0, len(swipe_ids), 500):
+        db.query(models.Swipe).filter(models.Swipe.id.in_(swipe_ids[start:start + 500])).delete(synchronize_session=False)
+    if max_rows is not None and len(rows) == max_rows:
+        # Archived rows are gone, so restarting at the last user picks up exactly what's left.
+        return len(rows), rows[-1][1]
+    return len(rows), None
@@ -0,0 +1,38 @@
+"""Shared setup for the benchmark scripts.
+
+backend.database creates its engine when it is imported, so every script calls
+`use_database()` before importing anything from `backend`. Databases live in
+$BENCH_DIR (default: <tmp>/connect-bench); large generated ones are reused
+between runs when `reuse=True`.
+"""
+import os
+import sys
+import logging
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.getenv("BENCH_DIR", os.path.join(tempfile.gettempdir(), "connect-bench"))
+
+
+def use_database(name: str, reuse: bool = False) -> str:
+    """Point backend.database at $BENCH_DIR/<name>; returns the path."""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, name)
+    if not reuse and os.path.exists(path):
+        os.remove(path)
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+    os.environ.setdefault("JOB_WORKER_INLINE", "false")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    logging.disable(logging.INFO)
+    return path
+
+
+def percentiles(samples, *ps):
+    ordered = sorted(samples)
+    return [ordered[min(len(ordered) - 1, int(len(ordered) * p))] for p in ps]
+
+
+def report(label: str, seconds):
+    p50, p99 = percentiles(seconds, 0.5, 0.99)
+    print(f"{label:34s} p50 {p50 * 1000:7.2f}ms  p99 {p99 * 1000:7.2f}ms")
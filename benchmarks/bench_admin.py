@@ -0,0 +1,87 @@
+"""Admin moderation list latency and query plans (user-031).
+
+    python benchmarks/bench_admin.py [reports]   # default 10,000,000
+
+Generates 1M users, the given number of reports and a fifth as many blocks,
+Pareto-distributed over reported users (reused on later runs). Each list is
+timed over 20 runs and its SELECTs are shown with EXPLAIN QUERY PLAN; the
+GROUP BY over all reports is the scan the counters avoid.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+
+from _common import use_database, report
+
+REPORTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+USERS = 1_000_000
+path = use_database(f"admin_{REPORTS}.db", reuse=True)
+fresh = not os.path.exists(path)
+
+from sqlalchemy import event, text  # noqa: E402
+from backend import crud, database, models  # noqa: E402
+
+
+def generate():
+    models.Base.metadata.create_all(bind=database.engine)
+    rng = random.Random(2)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA synchronous=OFF")
+    con.execute("PRAGMA journal_mode=OFF")
+    con.executemany("INSERT INTO users(id, email, is_active) VALUES (?, ?, 1)",
+                    ((i, f"{i}@example.com") for i in range(1, USERS + 1)))
+    con.executemany("INSERT INTO reports(id, reporter_id, reported_id, reason, timestamp) VALUES (?, ?, ?, 'spam', '2026-01-01')",
+                    ((i, rng.randint(1, USERS), int(rng.paretovariate(1.2)) % USERS + 1) for i in range(1, REPORTS + 1)))
+    con.executemany("INSERT INTO blocks(id, blocker_id, blocked_id, timestamp) VALUES (?, ?, ?, '2026-01-01')",
+                    ((i, rng.randint(1, USERS), int(rng.paretovariate(1.2)) % USERS + 1) for i in range(1, REPORTS // 5 + 1)))
+    # Same result as the refresh_safety_stats job, in one statement
+    con.execute("""INSERT INTO user_safety_stats(user_id, reports_received, blocks_received, last_reported_at)
+        SELECT u, sum(r), sum(b), max(t) FROM (
+            SELECT reported_id u, count(*) r, 0 b, max(timestamp) t FROM reports GROUP BY reported_id
+            UNION ALL SELECT blocked_id, 0, count(*), NULL FROM blocks GROUP BY blocked_id
+        ) GROUP BY u""")
+    con.commit()
+    con.close()
+
+
+def main():
+    if fresh:
+        generate()
+    db = database.SessionLocal()
+    statements = []
+    event.listen(database.engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, params, *args: statements.append((statement, params)))
+
+    def timed(label, call, runs=20):
+        latencies = []
+        for _ in range(runs):
+            statements.clear()
+            started = time.perf_counter()
+            result = call()
+            latencies.append(time.perf_counter() - started)
+        report(label, latencies)
+        raw = db.connection().connection
+        for statement, params in statements:
+            if statement.lstrip().startswith("SELECT"):
+                plan = raw.execute("EXPLAIN QUERY PLAN " + statement, params).fetchall()
+                print("    plan:", " | ".join(row[3] for row in plan))
+        return result
+
+    page = timed("top reported, page 1", lambda: crud.get_most_reported_users(db, 20))
+    cursor = page["next_cursor"]
+    for _ in range(50):
+        cursor = crud.get_most_reported_users(db, 20, cursor)["next_cursor"]
+    timed("top reported, page 52 (keyset)", lambda: crud.get_most_reported_users(db, 20, cursor))
+    timed("top blocked, page 1", lambda: crud.get_most_reported_users(db, 20, by="blocks"))
+    timed("recent reports, page 1", lambda: crud.get_recent_reports(db, 20))
+    timed("recent reports, deep cursor", lambda: crud.get_recent_reports(db, 20, str(REPORTS // 2)))
+    timed("reports about one user", lambda: crud.get_recent_reports(db, 20, None, 1))
+    timed("baseline: GROUP BY over reports", lambda: db.execute(text(
+        "SELECT reported_id, count(*) c FROM reports GROUP BY reported_id ORDER BY c DESC LIMIT 20"
+    )).all(), runs=3)
+
+
+if __name__ == "__main__":
+    main()
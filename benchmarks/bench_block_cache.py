@@ -0,0 +1,42 @@
+"""Queries per discovery and inbox call, cold and with a warm block cache (user-027).
+
+    python benchmarks/bench_block_cache.py
+"""
+from sqlalchemy import event
+
+from _common import use_database
+
+use_database("block_cache.db")
+from backend import crud, database, models  # noqa: E402
+
+USERS = 300
+
+
+def main():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    for user_id in range(1, USERS + 1):
+        db.add(models.User(id=user_id, email=f"{user_id}@example.com"))
+        db.add(models.Profile(user_id=user_id, name=f"User {user_id}"))
+    for partner_id in range(2, 52):
+        db.add(models.Match(user1_id=1, user2_id=partner_id))
+    for blocked_id in range(100, 150):
+        db.add(models.Block(blocker_id=1, blocked_id=blocked_id))
+    for blocker_id in range(150, 170):
+        db.add(models.Block(blocker_id=blocker_id, blocked_id=1))
+    db.commit()
+
+    queries = [0]
+    event.listen(database.engine, "before_cursor_execute", lambda *args: queries.__setitem__(0, queries[0] + 1))
+    for label, call in [
+        ("discovery", lambda: crud.get_potential_matches(db, 1, 10)),
+        ("inbox (50 matches)", lambda: crud.get_matches_for_user(db, 1)),
+    ]:
+        for run in ("cold", "warm"):
+            queries[0] = 0
+            call()
+            print(f"{label:20s} {run}: {queries[0]} queries")
+
+
+if __name__ == "__main__":
+    main()
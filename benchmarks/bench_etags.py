@@ -0,0 +1,60 @@
+"""Bytes and CPU for a replayed client session, with and without If-None-Match (user-029).
+
+    python benchmarks/bench_etags.py
+
+One user with 40 matches of 30 messages each visits 50 screens, each reading
+/api/users/me, /api/matches and one conversation. Nothing changes in between,
+so with conditional requests almost every read is a 304.
+"""
+import time
+
+from _common import use_database
+
+use_database("etags.db")
+from fastapi.testclient import TestClient  # noqa: E402
+from backend import auth, database, main as app_main, models  # noqa: E402
+
+
+def seed():
+    db = database.SessionLocal()
+    for user_id in range(1, 42):
+        db.add(models.User(id=user_id, email=f"{user_id}@example.com", hashed_password="x", is_active=True,
+                           is_onboarded=True, is_verified=False, is_admin=False))
+        db.add(models.Profile(user_id=user_id, name=f"User {user_id}", bio="b" * 200, images=["/uploads/a.png"] * 4,
+                              interests=["x", "y", "z"], lifestyle_badges=["Pets"], version=1))
+    for partner_id in range(2, 42):
+        db.add(models.Match(id=partner_id, user1_id=1, user2_id=partner_id))
+        for _ in range(30):
+            db.add(models.Message(match_id=partner_id, sender_id=partner_id, text="hello there " * 5))
+    db.commit()
+    db.close()
+
+
+def replay(client, headers, conditional: bool):
+    tags, body_bytes, not_modified = {}, 0, 0
+    started = time.process_time()
+    for screen in range(50):
+        for url in ["/api/users/me", "/api/matches", f"/api/matches/{2 + screen % 5}/messages"]:
+            request_headers = dict(headers)
+            if conditional and url in tags:
+                request_headers["If-None-Match"] = tags[url]
+            response = client.get(url, headers=request_headers)
+            body_bytes += len(response.content)
+            not_modified += response.status_code == 304
+            if "etag" in response.headers:
+                tags[url] = response.headers["etag"]
+    return body_bytes, time.process_time() - started, not_modified
+
+
+def main():
+    seed()
+    client = TestClient(app_main.app)
+    headers = {"Authorization": "Bearer " + auth.create_access_token({"sub": "1@example.com"})}
+    replay(client, headers, False)  # warm up
+    for conditional in (False, True):
+        body_bytes, cpu, not_modified = replay(client, headers, conditional)
+        print(f"conditional={conditional}: {body_bytes:,} body bytes, {cpu * 1000:.0f}ms CPU, {not_modified}/150 were 304")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Message send throughput and latency (user-026).
+
+    python benchmarks/bench_messages.py sync|commit|enqueue
+
+20 threads each send 100 messages through crud.create_message. "sync" is the
+original one-commit-per-message path; "commit" and "enqueue" go through the
+write-behind buffer with that durability.
+"""
+import sys
+import time
+import threading
+
+from _common import use_database, report
+
+use_database("messages.db")
+from backend import crud, database, message_buffer, models, schemas  # noqa: E402
+
+THREADS, PER_THREAD = 20, 100
+
+
+def main(mode: str):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    for user_id in range(1, THREADS * 2 + 1):
+        db.add(models.User(id=user_id, email=f"{user_id}@example.com"))
+    for match_id in range(1, THREADS + 1):
+        db.add(models.Match(id=match_id, user1_id=2 * match_id - 1, user2_id=2 * match_id))
+    db.commit()
+    db.close()
+
+    if mode != "sync":
+        message_buffer.buffer = message_buffer.MessageWriteBuffer(durability=mode)
+        message_buffer.buffer.start()
+
+    latencies = []
+    lock = threading.Lock()
+
+    def sender(i):
+        session = database.SessionLocal()
+        mine = []
+        for _ in range(PER_THREAD):
+            started = time.perf_counter()
+            assert crud.create_message(session, schemas.MessageCreate(text="hi"), 2 * i + 1, i + 1) is not None
+            mine.append(time.perf_counter() - started)
+        session.close()
+        with lock:
+            latencies.extend(mine)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=sender, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if message_buffer.buffer:
+        message_buffer.buffer.stop()
+
+    db = database.SessionLocal()
+    stored = db.query(models.Message).count()
+    print(f"{mode}: {stored} messages stored, {stored / elapsed:.0f} msg/s")
+    report("send latency", latencies)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "sync")
@@ -0,0 +1,64 @@
+"""Discovery latency through the API with a cold and a warm profile cache (user-033).
+
+    python benchmarks/bench_profile_cache.py
+
+20k users with full profiles; 1000 users each load a 20-card feed.
+"""
+import time
+import random
+
+from _common import use_database, report
+
+use_database("profile_cache.db")
+from fastapi.testclient import TestClient  # noqa: E402
+from backend import auth, database, main as app_main, models  # noqa: E402
+from backend.profile_cache import profile_cache  # noqa: E402
+
+USERS = 20_000
+
+
+def seed():
+    rng = random.Random(4)
+    db = database.SessionLocal()
+    for user_id in range(1, USERS + 1):
+        db.add(models.User(id=user_id, email=f"{user_id}@example.com", hashed_password="x", is_active=True,
+                           is_onboarded=True, is_verified=False, is_admin=False))
+        db.add(models.Profile(
+            user_id=user_id, name=f"User {user_id}", age=25, bio="b" * 300, gender=rng.choice(["Man", "Woman"]),
+            images=[f"/uploads/{user_id}_{k}.png" for k in range(6)],
+            interests=["hiking", "coffee", "film", "music", "travel"], lifestyle_badges=["Pets", "Non-smoker"],
+            job_title="Engineer", company="Acme", school="State",
+        ))
+    db.commit()
+    for user_id in range(1, 2001):  # some swipe history so feeds differ
+        for target_id in rng.sample(range(1, 200), 20):
+            db.add(models.Swipe(user_id=user_id, target_id=target_id, is_like=False))
+    db.commit()
+    db.close()
+
+
+def main():
+    seed()
+    client = TestClient(app_main.app)
+    headers = [{"Authorization": "Bearer " + auth.create_access_token({"sub": f"{i}@example.com"})}
+               for i in range(1, 1001)]
+
+    def feeds(label, clear):
+        latencies = []
+        for h in headers:
+            if clear:
+                profile_cache.clear()
+            started = time.perf_counter()
+            response = client.get("/api/users/discovery", params={"limit": 20}, headers=h)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200 and len(response.json()) == 20
+        report(label, latencies)
+
+    feeds("warm-up", False)
+    feeds("cold (cache cleared per call)", True)
+    feeds("warm", False)
+    print(profile_cache.metrics())
+
+
+if __name__ == "__main__":
+    main()
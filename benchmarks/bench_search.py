@@ -0,0 +1,79 @@
+"""Match search latency (user-028).
+
+    python benchmarks/bench_search.py [messages]   # default 10,000,000
+
+Generates 100k users, 500k matches and the given number of random messages
+with sqlite3 directly (minutes at 10M; the database is reused on later runs),
+then times search_matches for 50 random users plus the user with most matches.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+
+from _common import use_database, report
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+USERS, MATCHES = 100_000, 500_000
+path = use_database(f"search_{MESSAGES}.db", reuse=True)
+fresh = not os.path.exists(path)
+
+from sqlalchemy import text  # noqa: E402
+from backend import database, models, search  # noqa: E402
+
+
+def generate():
+    models.Base.metadata.create_all(bind=database.engine)
+    rng = random.Random(1)
+    words = [f"w{i}" for i in range(20000)] + ["pizza", "movie", "hiking", "coffee", "hello", "tonight"] * 2000
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA synchronous=OFF")
+    con.execute("PRAGMA journal_mode=OFF")
+    con.executemany("INSERT INTO users(id, email, is_active) VALUES (?, ?, 1)",
+                    ((i, f"{i}@example.com") for i in range(1, USERS + 1)))
+    con.executemany("INSERT INTO profiles(id, user_id, name) VALUES (?, ?, ?)",
+                    ((i, i, f"name{i} {rng.choice(words)}") for i in range(1, USERS + 1)))
+    pairs = set()
+    while len(pairs) < MATCHES:
+        a, b = rng.randint(1, USERS), rng.randint(1, USERS)
+        if a != b:
+            pairs.add((min(a, b), max(a, b)))
+    pairs = list(pairs)
+    con.executemany("INSERT INTO matches(id, user1_id, user2_id, timestamp) VALUES (?, ?, ?, '2026-01-01')",
+                    ((i + 1, a, b) for i, (a, b) in enumerate(pairs)))
+
+    def messages():
+        for i in range(1, MESSAGES + 1):
+            match_id = rng.randint(1, MATCHES)
+            yield i, match_id, pairs[match_id - 1][0], " ".join(rng.choices(words, k=8)), "2026-01-01 00:00:00", 0
+
+    con.executemany("INSERT INTO messages(id, match_id, sender_id, text, timestamp, is_read) VALUES (?, ?, ?, ?, ?, ?)",
+                    messages())
+    con.commit()
+    con.close()
+    started = time.time()
+    search.init_search_index(database.engine)
+    print(f"index build {time.time() - started:.0f}s")
+
+
+def main():
+    if fresh:
+        generate()
+    db = database.SessionLocal()
+    heavy = db.execute(text(
+        "SELECT user1_id FROM matches GROUP BY user1_id ORDER BY count(*) DESC LIMIT 1"
+    )).scalar()
+    rng = random.Random(2)
+    users = [rng.randint(1, USERS) for _ in range(50)] + [heavy] * 20
+    for query in ["pizza", "pizza movie", "w123", "zzz"]:
+        latencies = []
+        for user_id in users:
+            started = time.perf_counter()
+            search.search_matches(db, user_id, query, 20, 0)
+            latencies.append(time.perf_counter() - started)
+        report(f"q={query!r}", latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Swipe table size and lookup latency before and after archiving old passes (user-032).
+
+    python benchmarks/bench_swipe_archive.py [swipes]   # default 20,000,000
+    python benchmarks/bench_swipe_archive.py heavy
+
+The first form generates 200k users with swipes/200k swipes each (90% passes,
+90% older than the archive cutoff), reused on later runs, then measures
+table size and discovery / duplicate-check / reciprocal-like latency, runs the
+archive_swipes job, and measures again on a copy.
+
+"heavy" times discovery for one user with 10k archived passes over the lowest
+ids of 20k users, the worst case for paging through candidates in id order.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+from datetime import datetime
+
+from _common import use_database, report
+
+HEAVY = len(sys.argv) > 1 and sys.argv[1] == "heavy"
+SWIPES = 0 if HEAVY else int(sys.argv[1]) if len(sys.argv) > 1 else 20_000_000
+USERS = 20_000 if HEAVY else 200_000
+
+if HEAVY:
+    use_database("swipes_heavy.db")
+else:
+    base = use_database(f"swipes_{SWIPES}.db", reuse=True)
+    fresh = not os.path.exists(base)
+    path = use_database(f"swipes_{SWIPES}.work.db")
+
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from backend import crud, database, jobs, models, swipe_archive  # noqa: E402
+
+
+def generate():
+    engine = create_engine("sqlite:///" + base)
+    models.Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    rng = random.Random(3)
+    con = sqlite3.connect(base)
+    con.execute("PRAGMA synchronous=OFF")
+    con.execute("PRAGMA journal_mode=OFF")
+    con.executemany("INSERT INTO users(id, email, is_active) VALUES (?, ?, 1)",
+                    ((i, f"{i}@example.com") for i in range(1, USERS + 1)))
+    con.executemany("INSERT INTO profiles(id, user_id, name, gender, version, images, interests, lifestyle_badges) "
+                    "VALUES (?, ?, ?, ?, 1, '[]', '[]', '[]')",
+                    ((i, i, f"User {i}", rng.choice(["Man", "Woman"])) for i in range(1, USERS + 1)))
+
+    def swipes():
+        swipe_id = 0
+        for user_id in range(1, USERS + 1):
+            for target_id in rng.sample(range(1, USERS + 1), SWIPES // USERS):
+                swipe_id += 1
+                old = rng.random() < 0.9
+                yield (swipe_id, user_id, target_id, rng.random() < 0.1,
+                       "2026-01-01 00:00:00" if old else datetime.utcnow().isoformat(" "))
+
+    # Load without the indexes, then build them once
+    indexes = [row[0] for row in con.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'swipes' AND sql IS NOT NULL")]
+    for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'swipes' AND sql IS NOT NULL").fetchall():
+        con.execute(f"DROP INDEX {name}")
+    con.executemany("INSERT INTO swipes(id, user_id, target_id, is_like, timestamp) VALUES (?, ?, ?, ?, ?)", swipes())
+    for sql in indexes:
+        con.execute(sql)
+    con.commit()
+    con.close()
+
+
+def sizes():
+    with database.engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        swipes = conn.exec_driver_sql(
+            "SELECT sum(pgsize) FROM dbstat WHERE name = 'swipes' OR name LIKE 'ix_swipes_%'").scalar()
+        archive = conn.exec_driver_sql(
+            "SELECT sum(pgsize) FROM dbstat WHERE name LIKE '%swipe_archives%'").scalar() or 0
+        rows = conn.exec_driver_sql("SELECT count(*) FROM swipes").scalar()
+    return f"{rows:,} hot rows, swipes + indexes {swipes / 2 ** 20:.0f}MB, archives {archive / 2 ** 20:.0f}MB"
+
+
+def lookups(label):
+    db = database.SessionLocal()
+    users = random.Random(9).sample(range(1, USERS + 1), 200)
+    for name, call in [
+        ("discovery", lambda u: crud.get_potential_matches(db, u, 10)),
+        ("duplicate check", lambda u: swipe_archive.is_archived_pass(db, u, 5) or db.query(models.Swipe.id).filter(
+            models.Swipe.user_id == u, models.Swipe.target_id == 5).first()),
+        ("reciprocal like", lambda u: db.query(models.Swipe.id).filter(
+            models.Swipe.user_id == 5, models.Swipe.target_id == u, models.Swipe.is_like == True).first()),
+    ]:
+        latencies = []
+        for user_id in users:
+            started = time.perf_counter()
+            call(user_id)
+            latencies.append(time.perf_counter() - started)
+        report(f"{label} {name}", latencies)
+    db.close()
+
+
+def archive_scale():
+    if fresh:
+        generate()
+    database.engine.dispose()
+    shutil.copy(base, path)
+    print("before:", sizes())
+    lookups("before")
+
+    db = database.SessionLocal()
+    jobs.enqueue(db, "archive_swipes", {})
+    db.commit()
+    batches, started = 0, time.time()
+    while jobs.run_once(db):
+        batches += 1
+    print(f"archive job: {batches} batches, {time.time() - started:.0f}s")
+    print("after: ", sizes())
+    lookups("after")
+
+
+def heavy_swiper():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    db.execute(insert(models.User), [{"id": i, "email": f"{i}@example.com", "is_active": True} for i in range(1, USERS + 1)])
+    db.execute(insert(models.Profile), [{"user_id": i, "name": f"User {i}", "version": 1} for i in range(1, USERS + 1)])
+    archived = range(2, 10_002)
+    db.add(models.SwipeArchive(user_id=1, passed_ids=swipe_archive.encode(archived), count=len(archived),
+                               updated_at=datetime.utcnow()))
+    db.commit()
+
+    queries = [0]
+    event.listen(database.engine, "before_cursor_execute", lambda *args: queries.__setitem__(0, queries[0] + 1))
+    for run in ("cold", "warm", "warm"):
+        queries[0] = 0
+        started = time.perf_counter()
+        crud.get_potential_matches(db, 1, 10)
+        print(f"discovery ({run}): {queries[0]} queries, {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    heavy_swiper() if HEAVY else archive_scale()
@@ -0,0 +1,43 @@
+"""Unmatch request time and the background cleanup it leaves behind (user-030).
+
+    python benchmarks/bench_unmatch.py [messages]   # default 50,000
+"""
+import sys
+import time
+
+from _common import use_database
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+use_database("unmatch.db")
+from backend import crud, database, jobs, models, search  # noqa: E402
+
+
+def main():
+    models.Base.metadata.create_all(bind=database.engine)
+    search.init_search_index(database.engine)
+    db = database.SessionLocal()
+    db.add_all([models.User(id=1, email="a@example.com"), models.User(id=2, email="b@example.com"),
+                models.Match(id=1, user1_id=1, user2_id=2)])
+    db.commit()
+    db.execute(models.Message.__table__.insert(),
+               [{"match_id": 1, "sender_id": 1, "text": "hello " * 8} for _ in range(MESSAGES)])
+    db.commit()
+
+    started = time.perf_counter()
+    crud.unmatch_user(db, 1, 1)
+    print(f"unmatch request: {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    batches, longest = 0, 0.0
+    started = time.perf_counter()
+    while True:
+        batch_started = time.perf_counter()
+        if not jobs.run_once(db):
+            break
+        longest = max(longest, time.perf_counter() - batch_started)
+        batches += 1
+    print(f"worker: {batches} batches, {(time.perf_counter() - started) * 1000:.0f}ms total, "
+          f"longest batch {longest * 1000:.0f}ms, {db.query(models.Message).count()} messages left")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# backend.database builds its engine at import time; point it somewhere disposable.
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+os.environ.setdefault("JOB_WORKER_INLINE", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models, swipe_archive  # noqa: E402
+from backend.profile_cache import profile_cache  # noqa: E402
+from backend.safety_cache import block_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Process-wide caches would otherwise carry rows from one test's database into the next.
+    block_cache.clear()
+    profile_cache.clear()
+    swipe_archive.decoded_cache.clear()
+    yield
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def query_counter(engine):
+    """Counts SQL statements sent through `engine`; reset with `counter.clear()`."""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    yield statements
+    event.remove(engine, "before_cursor_execute", listener)
+
+
+@pytest.fixture
+def add_users(db):
+    """add_users(count, start=1): insert users with ids start..start+count-1, each with a profile."""
+    def add(count, start=1):
+        for user_id in range(start, start + count):
+            db.add(models.User(id=user_id, email=f"user{user_id}@example.com"))
+            db.add(models.Profile(user_id=user_id, name=f"User {user_id}"))
+        db.commit()
+    return add
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import auth, crud, database, models, safety_stats
+
+
+def test_bump_upserts(db, add_users):
+    add_users(1)
+    safety_stats.bump(db, 1, blocks=-1)
+    safety_stats.bump(db, 1, reports=1, reported_at=datetime(2024, 1, 1))
+    safety_stats.bump(db, 1, reports=1, blocks=2)
+    db.commit()
+    stats = db.query(models.UserSafetyStats).one()
+    assert (stats.reports_received, stats.blocks_received, stats.last_reported_at) == (2, 2, datetime(2024, 1, 1))
+
+
+def test_recompute_rebuilds_the_range_in_place(db, add_users):
+    add_users(5)
+    db.add_all([
+        models.Report(reporter_id=2, reported_id=1, reason="spam", timestamp=datetime(2024, 1, 1)),
+        models.Report(reporter_id=3, reported_id=1, reason="spam", timestamp=datetime(2024, 2, 1)),
+        models.Block(blocker_id=1, blocked_id=2),
+        # Drifted counters: too high, a user with nothing against them, one outside the range.
+        models.UserSafetyStats(user_id=1, reports_received=9, blocks_received=9),
+        models.UserSafetyStats(user_id=3, reports_received=1, blocks_received=0),
+        models.UserSafetyStats(user_id=5, reports_received=4, blocks_received=0),
+    ])
+    db.commit()
+
+    safety_stats.recompute(db, 1, 4)
+    db.commit()
+    rows = {
+        s.user_id: (s.reports_received, s.blocks_received, s.last_reported_at)
+        for s in db.query(models.UserSafetyStats)
+    }
+    assert rows == {1: (2, 0, datetime(2024, 2, 1)), 2: (0, 1, None), 5: (4, 0, None)}
+
+
+@pytest.fixture
+def reported(db, add_users):
+    add_users(30)
+    now = datetime.utcnow()
+    # user n is reported (n % 7) times, so many users tie on each count
+    for user_id in range(1, 31):
+        for i in range(user_id % 7):
+            db.add(models.Report(reporter_id=(user_id % 30) + 1, reported_id=user_id, timestamp=now - timedelta(minutes=i)))
+            safety_stats.bump(db, user_id, reports=1, reported_at=now)
+    db.commit()
+
+
+def walk(fetch, page_size):
+    items, cursor = [], None
+    while True:
+        page = fetch(page_size, cursor)
+        assert len(page["items"]) <= page_size
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+@pytest.mark.parametrize("page_size", [1, 4, 7, 100])
+def test_most_reported_pages_cover_every_user_once(db, reported, page_size):
+    items = walk(lambda limit, cursor: crud.get_most_reported_users(db, limit, cursor), page_size)
+    keys = [(item["reports_received"], item["user_id"]) for item in items]
+    assert keys == sorted(keys, reverse=True)
+    assert {item["user_id"] for item in items} == {n for n in range(1, 31) if n % 7}
+    assert len(items) == len(set(keys))
+
+
+@pytest.mark.parametrize("page_size", [1, 5, 100])
+def test_recent_reports_pages_cover_every_report_once(db, reported, page_size):
+    items = walk(lambda limit, cursor: crud.get_recent_reports(db, limit, cursor), page_size)
+    ids = [report.id for report in items]
+    assert ids == sorted(ids, reverse=True)
+    assert len(ids) == db.query(models.Report).count()
+
+
+def test_bad_cursor_starts_from_the_top(db, reported):
+    assert crud.get_recent_reports(db, 3, "nonsense")["items"] == crud.get_recent_reports(db, 3)["items"]
+
+
+@pytest.fixture
+def client(session_factory, reported):
+    from backend import main
+
+    def get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    main.app.dependency_overrides[database.get_db] = get_db
+    main.app.dependency_overrides[auth.get_current_admin] = lambda: models.User(id=1, is_admin=True)
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("path, available", [
+    ("/api/admin/reports/top", 26),  # users 1..30 except multiples of 7
+    ("/api/admin/blocks/top", 0),
+    ("/api/admin/reports", 87),
+])
+@pytest.mark.parametrize("limit, page_size", [(-5, 1), (-1, 1), (0, 1), (1000, 100)])
+def test_admin_limit_is_clamped(client, path, available, limit, page_size):
+    response = client.get(path, params={"limit": limit})
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == min(page_size, available)
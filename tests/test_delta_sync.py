@@ -0,0 +1,125 @@
+import base64
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, text
+
+from backend import crud, database, etags, models, schemas, search
+
+
+def sync(db, token):
+    """Rows a client holding `token` gets back, or None if it has to reset its list."""
+    max_match_id, max_message_id, digest = etags.decode_sync_token(token)
+    seen = [row for row in crud.get_inbox_state(db, 1)["matches"] if row[0] <= max_match_id]
+    if etags.inbox_digest(seen) != digest:
+        return None
+    return crud.get_matches_for_user(db, 1, after_match_id=max_match_id, after_message_id=max_message_id)
+
+
+def token_for(db):
+    return etags.encode_sync_token(crud.get_inbox_state(db, 1))
+
+
+def test_message_with_an_older_timestamp_is_still_synced(db, add_users):
+    add_users(3)
+    db.add_all([models.Match(id=1, user1_id=1, user2_id=2), models.Match(id=2, user1_id=1, user2_id=3)])
+    db.add(models.Message(match_id=2, sender_id=3, text="latest", timestamp=datetime.utcnow()))
+    db.commit()
+    token = token_for(db)
+    assert sync(db, token) == []
+
+    # Stamped before the sync above but committed after it.
+    stamped = datetime.utcnow() - timedelta(seconds=5)
+    db.add(models.Message(match_id=1, sender_id=2, text="late commit", timestamp=stamped))
+    db.commit()
+    assert [row["id"] for row in sync(db, token)] == [1]
+
+
+def test_new_match_is_a_delta_not_a_reset(db, add_users):
+    add_users(3)
+    db.add(models.Match(user1_id=1, user2_id=2))
+    db.commit()
+    token = token_for(db)
+
+    db.add(models.Match(user1_id=1, user2_id=3))
+    db.commit()
+    assert [row["user"]["id"] for row in sync(db, token)] == [3]
+
+
+def test_removed_match_resets_even_when_the_count_recovers(db, add_users):
+    add_users(4)
+    db.add_all([models.Match(user1_id=1, user2_id=2), models.Match(user1_id=1, user2_id=3)])
+    db.commit()
+    token = token_for(db)
+
+    db.query(models.Match).filter(models.Match.user2_id == 2).delete()
+    db.add(models.Match(user1_id=1, user2_id=4))
+    db.commit()
+    assert sync(db, token) is None
+
+
+def test_hard_deleted_match_id_is_not_reused(db, add_users):
+    add_users(3)
+    db.add_all([models.Match(user1_id=1, user2_id=2), models.Match(user1_id=1, user2_id=3)])
+    db.commit()
+    token = token_for(db)
+    newest = db.query(models.Match).filter(models.Match.user2_id == 3).one()
+    newest_id = newest.id
+    db.delete(newest)
+    db.commit()
+
+    match = models.Match(user1_id=1, user2_id=3)
+    db.add(match)
+    db.commit()
+    assert match.id > newest_id
+    assert sync(db, token) is None
+
+
+def test_partner_profile_edit_resets(db, add_users):
+    add_users(2)
+    db.add(models.Match(user1_id=1, user2_id=2))
+    db.commit()
+    token = token_for(db)
+
+    crud.update_user_profile(db, schemas.ProfileUpdate(name="Renamed"), 2)
+    assert sync(db, token) is None
+    assert sync(db, token_for(db)) == []
+
+
+def test_old_tokens_are_rejected():
+    assert etags.decode_sync_token("bm90IGEgdG9rZW4=") is None
+    old_format = "2024-01-01T00:00:00|3|7|2"
+    assert etags.decode_sync_token(base64.urlsafe_b64encode(old_format.encode()).decode()) is None
+
+
+def test_existing_sqlite_tables_gain_autoincrement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR)"))
+        conn.execute(text("CREATE TABLE matches (id INTEGER PRIMARY KEY, user1_id INTEGER, user2_id INTEGER)"))
+        conn.execute(text(
+            "CREATE TABLE messages (id INTEGER PRIMARY KEY, match_id INTEGER REFERENCES matches(id), "
+            "sender_id INTEGER, text TEXT)"
+        ))
+        conn.execute(text("CREATE INDEX ix_messages_match_id ON messages (match_id)"))
+        conn.execute(text("INSERT INTO matches (id, user1_id, user2_id) VALUES (1, 1, 2)"))
+        conn.execute(text("INSERT INTO messages (id, match_id, sender_id, text) VALUES (5, 1, 1, 'hello there')"))
+    models.Base.metadata.create_all(bind=engine)
+    database.add_missing_columns_and_indexes(engine, models.Base.metadata)
+    search.init_search_index(engine)
+
+    database.add_sqlite_autoincrement(engine, models.Base.metadata)
+    search.init_search_index(engine)
+
+    with engine.begin() as conn:
+        for table in ("matches", "messages"):
+            sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = :name"), {"name": table}).scalar()
+            assert "AUTOINCREMENT" in sql
+        assert conn.execute(text("SELECT id, text FROM messages")).all() == [(5, "hello there")]
+        conn.execute(text("DELETE FROM messages WHERE id = 5"))
+        conn.execute(text("INSERT INTO messages (match_id, sender_id, text) VALUES (1, 1, 'hello again')"))
+        assert conn.execute(text("SELECT id FROM messages")).scalar() == 6
+        # The search triggers were recreated on the new table.
+        hits = conn.execute(text("SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'again'")).scalars().all()
+        assert hits == [6]
+    assert "ix_messages_match_id" in {i["name"] for i in inspect(engine).get_indexes("messages")}
+    engine.dispose()
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from backend import jobs, models
+
+
+@pytest.fixture
+def flaky_handler(monkeypatch):
+    calls = []
+
+    def flaky(db, payload):
+        calls.append(dict(payload))
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(jobs.HANDLERS, "flaky", flaky)
+    return calls
+
+
+def make_due(db, job):
+    db.query(models.Job).filter(models.Job.id == job.id).update({models.Job.run_after: datetime.utcnow()})
+    db.commit()
+
+
+def test_failed_job_backs_off_then_gives_up(db, flaky_handler):
+    job = jobs.enqueue(db, "flaky", {})
+    db.commit()
+
+    for attempt in range(1, jobs.JOB_MAX_ATTEMPTS):
+        started = datetime.utcnow()
+        assert jobs.run_once(db)
+        db.refresh(job)
+        assert (job.status, job.attempts) == ("pending", attempt)
+        assert job.run_after >= started + timedelta(seconds=2 ** attempt)
+        assert not jobs.run_once(db)  # not due yet
+        make_due(db, job)
+
+    assert jobs.run_once(db)
+    db.refresh(job)
+    assert (job.status, job.attempts) == ("failed", jobs.JOB_MAX_ATTEMPTS)
+    assert "boom" in job.last_error
+    assert len(flaky_handler) == jobs.JOB_MAX_ATTEMPTS
+
+
+def test_payload_cursor_is_saved_between_batches(db, monkeypatch):
+    seen = []
+
+    def count(db, payload):
+        seen.append(payload.get("n", 0))
+        payload["n"] = seen[-1] + 1
+        return payload["n"] < 3
+
+    monkeypatch.setitem(jobs.HANDLERS, "count", count)
+    job = jobs.enqueue(db, "count", {})
+    db.commit()
+    while jobs.run_once(db):
+        pass
+    db.refresh(job)
+    assert job.status == "done"
+    assert seen == [0, 1, 2]
+
+
+def test_expired_lease_is_reclaimed(db):
+    job = jobs.enqueue(db, "delete_match", {"match_id": 1})
+    db.commit()
+    assert jobs._claim_next(db).id == job.id
+    assert jobs._claim_next(db) is None
+
+    job.started_at = datetime.utcnow() - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 1)
+    db.commit()
+    assert jobs._claim_next(db).id == job.id
+
+
+@pytest.fixture
+def doomed_account(db, add_users, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "UPLOAD_DIR", str(tmp_path))
+    (tmp_path / "photo.png").write_bytes(b"png")
+    (tmp_path / "victim.png").write_bytes(b"png")
+    add_users(3)
+    # victim.png belongs to user 2; user 1 only lists its URL.
+    db.query(models.Profile).filter(models.Profile.user_id == 1).update(
+        {models.Profile.images: ["/uploads/photo.png", "/uploads/victim.png"]}
+    )
+    db.add_all([
+        models.Upload(filename="photo.png", user_id=1),
+        models.Upload(filename="victim.png", user_id=2),
+        models.Match(id=1, user1_id=1, user2_id=2),
+        models.Message(match_id=1, sender_id=1, text="hi"),
+        models.Swipe(user_id=1, target_id=2, is_like=True),
+        models.Swipe(user_id=3, target_id=1, is_like=False),
+        models.Report(reporter_id=1, reported_id=3, reason="spam"),
+        models.Report(reporter_id=2, reported_id=1, reason="rude"),
+    ])
+    db.commit()
+    job = jobs.enqueue(db, "delete_account", {"user_id": 1})
+    db.commit()
+    return job, tmp_path / "photo.png"
+
+
+def test_delete_account_keeps_reports_and_removes_uploads_last(db, doomed_account):
+    job, photo = doomed_account
+    while jobs.run_once(db):
+        if photo.exists():
+            assert db.query(models.Job.status).filter(models.Job.id == job.id).scalar() != "done"
+    db.refresh(job)
+    assert job.status == "done"
+    assert not photo.exists()
+    assert (photo.parent / "victim.png").exists()
+    assert [u.filename for u in db.query(models.Upload)] == ["victim.png"]
+
+    assert db.query(models.Swipe).count() == 0
+    assert db.query(models.Message).count() == 0
+    reports = {(r.reporter_id, r.reported_id) for r in db.query(models.Report)}
+    assert reports == {(None, 3), (2, 1)}
+    tombstone = db.query(models.User).filter(models.User.id == 1).one()
+    assert not tombstone.is_active and tombstone.email == "deleted-1@deleted.invalid"
+    assert db.query(models.Profile).filter(models.Profile.user_id == 1).count() == 0
+
+
+def test_delete_account_keeps_uploads_if_the_batch_fails(db, doomed_account, monkeypatch):
+    job, photo = doomed_account
+    original_delete = db.delete
+
+    def failing_delete(instance):
+        original_delete(instance)
+        if isinstance(instance, models.Profile):
+            raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "delete", failing_delete)
+    while jobs.run_once(db):
+        make_due(db, job)
+    db.refresh(job)
+    assert job.status == "failed"
+    assert photo.exists()
+    assert db.query(models.Profile).filter(models.Profile.user_id == 1).count() == 1
+
+
+def test_swipe_steps_use_an_index(db):
+    for column in ("user_id", "target_id"):
+        plan = " ".join(str(row[-1]) for row in db.execute(text(
+            f"EXPLAIN QUERY PLAN SELECT id FROM swipes WHERE {column} = 1 LIMIT 500"
+        )))
+        assert "USING" in plan and "INDEX" in plan and "SCAN swipes" not in plan.replace("USING COVERING", ""), plan
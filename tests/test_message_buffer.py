@@ -0,0 +1,106 @@
+import time
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from backend import message_buffer, models
+from backend.message_buffer import MessageFlushError, MessageWriteBuffer
+
+
+@pytest.fixture
+def match(db, add_users):
+    add_users(2)
+    db.add(models.Match(id=1, user1_id=1, user2_id=2))
+    db.commit()
+    return 1
+
+
+def make_buffer(session_factory, durability):
+    buffer = MessageWriteBuffer(session_factory=session_factory, interval_ms=1, durability=durability)
+    buffer.start()
+    return buffer
+
+
+def stored_ids(db):
+    db.expire_all()
+    return [m.id for m in db.query(models.Message).order_by(models.Message.id)]
+
+
+def test_commit_mode_writes_before_returning(session_factory, db, match):
+    buffer = make_buffer(session_factory, "commit")
+    try:
+        message = buffer.submit(match, 1, "hello")
+        assert stored_ids(db) == [message.id]
+    finally:
+        buffer.stop()
+
+
+def test_bad_row_does_not_block_the_rest_of_its_batch(session_factory, db, match):
+    buffer = MessageWriteBuffer(session_factory=session_factory, durability="enqueue")
+    buffer._next_id = 1
+    db.add(models.Message(id=2, match_id=match, sender_id=1, text="already here"))
+    db.commit()
+
+    for text_ in ("a", "b", "c"):  # id 2 clashes with the existing row
+        buffer.submit(match, 1, text_)
+    assert buffer.flush() is False
+    assert stored_ids(db) == [1, 2, 3]
+    assert len(buffer._queue) == 1
+
+    for _ in range(message_buffer.MESSAGE_FLUSH_MAX_ATTEMPTS - 1):
+        buffer.flush()
+    assert not buffer._queue
+    assert [row["id"] for row in buffer.dead_letters] == [2]
+
+
+def test_stop_returns_when_the_table_is_gone(session_factory, db, match, monkeypatch):
+    monkeypatch.setattr(message_buffer, "MESSAGE_DRAIN_TIMEOUT", 1)
+    buffer = make_buffer(session_factory, "enqueue")
+    db.execute(text("DROP TABLE messages"))
+    db.commit()
+
+    buffer.submit(match, 1, "lost")
+    stopper = threading.Thread(target=buffer.stop)
+    started = time.monotonic()
+    stopper.start()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    assert time.monotonic() - started < 3
+    assert [row["text"] for row in buffer.dead_letters] == ["lost"]
+
+
+def test_commit_timeout_withdraws_the_message(session_factory, db, match, monkeypatch):
+    monkeypatch.setattr(message_buffer, "MESSAGE_COMMIT_TIMEOUT", 0.05)
+    buffer = MessageWriteBuffer(session_factory=session_factory, durability="commit")
+    buffer._next_id = 1  # not started: nothing flushes
+
+    with pytest.raises(MessageFlushError):
+        buffer.submit(match, 1, "slow")
+    assert not buffer._queue
+    buffer.flush()
+    assert stored_ids(db) == []
+
+
+def test_commit_mode_reports_row_errors(session_factory, db, match):
+    buffer = MessageWriteBuffer(session_factory=session_factory, durability="commit")
+    buffer._next_id = 1
+    db.add(models.Message(id=1, match_id=match, sender_id=1, text="already here"))
+    db.commit()
+
+    result = {}
+
+    def send():
+        try:
+            buffer.submit(match, 1, "clash")
+        except MessageFlushError as exc:
+            result["error"] = exc
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    while not buffer._queue:
+        time.sleep(0.001)
+    buffer.flush()
+    sender.join(1)
+    assert "error" in result
+    assert not buffer.dead_letters
@@ -0,0 +1,65 @@
+from backend import crud, models, schemas
+from backend.profile_cache import ProfileCache, profile_cache
+
+
+def versions(db, *user_ids):
+    return dict(db.query(models.Profile.user_id, models.Profile.version).filter(
+        models.Profile.user_id.in_(user_ids)
+    ).all())
+
+
+def test_misses_are_loaded_in_one_query_and_counted(db, add_users, query_counter):
+    add_users(3)
+    cache = ProfileCache()
+    wanted = versions(db, 1, 2, 3)
+    query_counter.clear()
+    payloads = cache.get_many(db, wanted)
+    assert len(query_counter) == 1
+    assert {user_id: p["name"] for user_id, p in payloads.items()} == {1: "User 1", 2: "User 2", 3: "User 3"}
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    query_counter.clear()
+    assert cache.get_many(db, wanted) == payloads
+    assert query_counter == []
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_bumped_version_is_a_miss(db, add_users):
+    add_users(1)
+    cache = ProfileCache()
+    cache.get_many(db, versions(db, 1))
+
+    # Edited by another process: this one's entry is stale but still there.
+    db.query(models.Profile).filter(models.Profile.user_id == 1).update(
+        {models.Profile.name: "Renamed", models.Profile.version: models.Profile.version + 1}
+    )
+    db.commit()
+    assert cache.get_many(db, versions(db, 1))[1]["name"] == "Renamed"
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_update_user_profile_invalidates(db, add_users):
+    add_users(1)
+    profile_cache.get_many(db, versions(db, 1))
+    assert profile_cache.metrics()["size"] == 1
+
+    crud.update_user_profile(db, schemas.ProfileUpdate(name="Renamed"), 1)
+    assert profile_cache.metrics()["size"] == 0
+    assert profile_cache.get_many(db, versions(db, 1))[1]["name"] == "Renamed"
+
+
+def test_lru_eviction_respects_max_entries(db, add_users):
+    add_users(4)
+    cache = ProfileCache(max_entries=2)
+    cache.get_many(db, versions(db, 1))
+    cache.get_many(db, versions(db, 2))
+    cache.get_many(db, versions(db, 1))  # 1 is now the most recently used
+    cache.get_many(db, versions(db, 3))
+    assert cache.metrics()["size"] == 2
+    assert cache.evictions == 1
+
+    hits = cache.hits
+    cache.get_many(db, versions(db, 1, 3))
+    assert cache.hits == hits + 2
+    cache.get_many(db, versions(db, 2))
+    assert cache.hits == hits + 2
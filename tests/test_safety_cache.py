@@ -0,0 +1,52 @@
+from backend import crud, models, schemas
+from backend.safety_cache import BlockCache, block_cache
+
+
+def test_create_block_updates_both_users_cached_sets(db, add_users):
+    add_users(3)
+    assert block_cache.get(db, 1) == frozenset()
+    assert block_cache.get(db, 2) == frozenset()
+    loads = block_cache.loads
+
+    crud.create_block(db, schemas.BlockCreate(blocked_id=2), 1)
+    assert block_cache.get(db, 1) == {2}
+    assert block_cache.get(db, 2) == {1}
+    assert block_cache.loads == loads
+
+
+def test_discovery_and_inbox_hide_blocks_in_both_directions(db, add_users):
+    add_users(4)
+    db.add_all([models.Match(user1_id=1, user2_id=user_id) for user_id in (2, 3, 4)])
+    db.add_all([models.Block(blocker_id=1, blocked_id=2), models.Block(blocker_id=3, blocked_id=1)])
+    db.commit()
+
+    assert [p["user_id"] for p in crud.get_potential_matches(db, 1)] == [4]
+    assert [row["user"]["id"] for row in crud.get_matches_for_user(db, 1)] == [4]
+    for user_id in (2, 3):
+        assert 1 not in [p["user_id"] for p in crud.get_potential_matches(db, user_id)]
+        assert crud.get_matches_for_user(db, user_id) == []
+
+
+class RacingSession:
+    """Runs `during_load` while the cache is loading, as if another request blocked someone then."""
+
+    def __init__(self, db, during_load):
+        self.db = db
+        self.during_load = during_load
+
+    def query(self, *args):
+        self.during_load()
+        return self.db.query(*args)
+
+
+def test_load_racing_a_block_is_not_cached(db, add_users):
+    add_users(3)
+    cache = BlockCache()
+    # The load read the blocks table before user 3's block was committed.
+    racing = RacingSession(db, lambda: cache.add(3, 1))
+    assert cache.get(racing, 1) == frozenset()
+
+    db.add(models.Block(blocker_id=3, blocked_id=1))
+    db.commit()
+    assert cache.get(db, 1) == {3}
+    assert cache.loads == 2
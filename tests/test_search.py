@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from backend import crud, models, schemas, search
+
+
+@pytest.fixture(autouse=True)
+def search_index(engine):
+    search.init_search_index(engine)
+
+
+@pytest.fixture
+def inbox(db, add_users):
+    """User 1 matched with Sam Archer (2), Sam Baker (3) and Alex (4), who keeps mentioning Sam."""
+    add_users(4)
+    for user_id, name in ((2, "Sam Archer"), (3, "Sam Baker"), (4, "Alex")):
+        db.query(models.Profile).filter(models.Profile.user_id == user_id).update({models.Profile.name: name})
+    db.add_all([models.Match(id=user_id, user1_id=1, user2_id=user_id) for user_id in (2, 3, 4)])
+    db.add_all([models.Message(id=10 + n, match_id=4, sender_id=4, text=f"sam said hi {n}") for n in range(3)])
+    db.commit()
+
+
+def hits(db, q, **kwargs):
+    return [(r["user_id"], r["message"].id if r["message"] else None) for r in search.search_matches(db, 1, q, **kwargs)]
+
+
+def test_names_come_before_messages(db, inbox):
+    assert hits(db, "sam") == [(2, None), (3, None), (4, 12), (4, 11), (4, 10)]
+
+
+def test_pages_cross_from_name_hits_into_message_hits(db, inbox):
+    assert hits(db, "sam", limit=2, offset=1) == [(3, None), (4, 12)]
+    assert hits(db, "sam", limit=2, offset=3) == [(4, 11), (4, 10)]
+    assert hits(db, "sam", limit=2, offset=5) == []
+
+
+def test_profile_rename_is_reindexed(db, inbox):
+    crud.update_user_profile(db, schemas.ProfileUpdate(name="Robin Archer"), 2)
+    assert hits(db, "robin") == [(2, None)]
+    assert (2, None) not in hits(db, "sam")
+
+
+def test_deleted_message_is_unindexed(db, inbox):
+    db.delete(db.get(models.Message, 12))
+    db.commit()
+    assert hits(db, "said") == [(4, 11), (4, 10)]
+
+
+def test_blocked_partners_are_hidden(db, inbox):
+    # Blocked by the partner, with the match row still live.
+    db.add(models.Block(blocker_id=4, blocked_id=1))
+    db.commit()
+    assert hits(db, "sam") == [(2, None), (3, None)]
+
+
+def test_soft_deleted_matches_are_hidden(db, inbox):
+    db.query(models.Match).filter(models.Match.id.in_([2, 4])).update(
+        {models.Match.deleted_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    assert hits(db, "sam") == [(3, None)]
+
+
+@pytest.mark.parametrize("q", ["", "   ", "?!...", '"*'])
+def test_queries_without_words_return_nothing(db, inbox, q):
+    assert search.search_matches(db, 1, q) == []
@@ -0,0 +1,122 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from backend import crud, jobs, models, swipe_archive
+
+
+@pytest.mark.parametrize("ids", [
+    [],
+    [1],
+    [5, 3, 3, 9, 1],
+    [1, 2 ** 32 - 1],
+    random.Random(7).sample(range(1, 10 ** 7), 50_000),
+])
+def test_encode_decode_round_trip(ids):
+    decoded = swipe_archive.decode(swipe_archive.encode(ids))
+    assert list(decoded) == sorted(set(ids))
+    for target_id in set(ids):
+        assert swipe_archive.contains(decoded, target_id)
+    assert not swipe_archive.contains(decoded, 0)
+
+
+def test_run_end():
+    passed = swipe_archive.decode(swipe_archive.encode([2, 3, 4, 5, 7, 8, 10]))
+    assert swipe_archive.run_end(passed, 1) == 0
+    assert swipe_archive.run_end(passed, 2) == 5
+    assert swipe_archive.run_end(passed, 4) == 5
+    assert swipe_archive.run_end(passed, 7) == 8
+    assert swipe_archive.run_end(passed, 10) == 10
+    assert swipe_archive.run_end(passed, 11) == 10
+    assert swipe_archive.between(passed, 4, 9) == {4, 5, 7, 8}
+
+
+def add_passes(db, user_id, target_ids, days_ago):
+    timestamp = datetime.utcnow() - timedelta(days=days_ago)
+    db.execute(insert(models.Swipe), [
+        {"user_id": user_id, "target_id": target_id, "is_like": False, "timestamp": timestamp}
+        for target_id in target_ids
+    ])
+    db.commit()
+
+
+def test_archive_passes_moves_only_old_passes(db, add_users):
+    add_users(10)
+    add_passes(db, 1, [2, 3], days_ago=60)
+    add_passes(db, 1, [4], days_ago=1)
+    db.add(models.Swipe(user_id=1, target_id=5, is_like=True, timestamp=datetime.utcnow() - timedelta(days=60)))
+    db.commit()
+
+    cutoff = datetime.utcnow() - timedelta(days=swipe_archive.SWIPE_ARCHIVE_AFTER_DAYS)
+    assert swipe_archive.archive_passes(db, 1, 10, cutoff) == (2, None)
+    db.commit()
+    assert list(swipe_archive.archived_passes(db, 1)) == [2, 3]
+    assert sorted(s.target_id for s in db.query(models.Swipe)) == [4, 5]
+
+    # A second run merges into the cached archive, and the cache notices.
+    add_passes(db, 1, [6], days_ago=60)
+    swipe_archive.archive_passes(db, 1, 10, cutoff)
+    db.commit()
+    assert list(swipe_archive.archived_passes(db, 1)) == [2, 3, 6]
+    assert swipe_archive.is_archived_pass(db, 1, 6)
+    assert not swipe_archive.is_archived_pass(db, 1, 4)
+
+
+def test_archive_job_resumes_inside_a_heavy_swipers_passes(db, add_users, monkeypatch):
+    add_users(10)
+    add_passes(db, 1, range(2, 9), days_ago=60)
+    add_passes(db, 2, [3, 4], days_ago=60)
+    monkeypatch.setattr(jobs, "SWIPE_ARCHIVE_ROWS_PER_BATCH", 3)
+    batches = []
+    archive_passes = swipe_archive.archive_passes
+
+    def spy(db, first_user_id, *args):
+        result = archive_passes(db, first_user_id, *args)
+        batches.append((first_user_id, result))
+        return result
+
+    monkeypatch.setattr(swipe_archive, "archive_passes", spy)
+    job = jobs.enqueue(db, "archive_swipes", {})
+    db.commit()
+    while jobs.run_once(db):
+        pass
+
+    db.refresh(job)
+    assert job.status == "done"
+    assert batches == [(0, (3, 1)), (1, (3, 1)), (1, (3, 2)), (2, (0, None))]
+    assert db.query(models.Swipe).count() == 0
+    assert list(swipe_archive.archived_passes(db, 1)) == list(range(2, 9))
+    assert list(swipe_archive.archived_passes(db, 2)) == [3, 4]
+
+
+def test_archived_passes_is_cached_between_calls(db, add_users, query_counter):
+    add_users(3)
+    add_passes(db, 1, [2, 3], days_ago=60)
+    swipe_archive.archive_passes(db, 1, 1, datetime.utcnow())
+    db.commit()
+
+    swipe_archive.archived_passes(db, 1)
+    query_counter.clear()
+    assert swipe_archive.is_archived_pass(db, 1, 3)
+    assert len(query_counter) == 1  # the (updated_at, count) check, no blob
+
+
+@pytest.mark.parametrize("archived", [
+    range(2, 4002),  # the lowest ids, which discovery reaches first
+    range(2, 8002, 2),  # interleaved, so there is no run to jump over
+])
+def test_discovery_skips_a_large_archive_in_few_queries(db, query_counter, archived):
+    users = 5000
+    db.execute(insert(models.User), [{"id": i, "email": f"u{i}@example.com", "is_active": True} for i in range(1, users + 1)])
+    db.execute(insert(models.Profile), [{"user_id": i, "name": f"User {i}", "version": 1} for i in range(1, users + 1)])
+    db.commit()
+    db.add(models.SwipeArchive(user_id=1, passed_ids=swipe_archive.encode(archived), count=len(archived), updated_at=datetime.utcnow()))
+    db.commit()
+
+    query_counter.clear()
+    profiles = crud.get_potential_matches(db, 1, limit=10)
+    expected = [user_id for user_id in range(2, users + 1) if user_id not in set(archived)][:10]
+    assert [p["user_id"] for p in profiles] == expected
+    assert len(query_counter) <= 15, len(query_counter)